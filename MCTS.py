@@ -6,9 +6,27 @@ import time
 import random
 from math import sqrt, log, exp
 
+import batch_rollout
+import gbm_model
+from moves import (legal_moves, decode_move, height_score_after, is_winning, to_move, BLOCK_FLAG, WIN_FLAG,
+                   MOVE_MASK, DECODE)
+
 EXPLORATION_FACTOR = 3  # Parameter that decides tradeoff between exploration and exploitation
 TURN_TIME = 30  # Max amount of time MCTS agent can search for best move
 MAX_ROLLOUT = 15000  # Max number of rollouts MCTS agent can have before choosing best move
+PONDER_TIME = 120  # Max amount of time MCTS agent keeps searching during the opponent's turn
+MAX_NODES = 250000  # Max number of nodes kept in the tree, least visited subtrees are pruned past this
+PRUNE_TARGET = 0.75  # Pruning frees nodes until the tree is back to this share of MAX_NODES
+REROOT_DEPTH = 2  # Plies below the old root searched for the new position, ie our move and the opponent's reply
+STOP_RULE = 'visits'  # Ends the search once the move can't change: 'visits', 'confidence', or None for the full budget
+STOP_CHECK_INTERVAL = 100  # Rollouts between two checks of the stopping rule
+CONFIDENCE_Z = 2.58  # Width of the win rate confidence intervals of the 'confidence' rule, about 99%
+ROLLOUT_DEPTH = None  # Plies a rollout plays before the position is scored by the evaluator, None to play to the end
+ROLLOUT_EVALUATOR = 'minimax'  # Scores truncated rollouts: 'minimax' or 'gbm', see evaluate_position
+MODEL_SCORE = 'heuristic'  # Exploration prior of the nodes: 'heuristic' or 'ml' (the gradient boosting model)
+MINIMAX_SCALE = 40  # Game.get_minimax_score is divided by this before the logistic, fitted on random games
+PROVEN_WIN = 'win'  # Game theoretic value of a node, for the player who moved into it
+PROVEN_LOSS = 'loss'
 SPACE_LIST = [(i, j) for i in range(5) for j in range(5)]  # List of spaces in board, used with for loops
 
 random.seed(int(time.time() * 1e6) % 2**32)  # set seed
@@ -21,9 +39,11 @@ class MCTSNode:
     Attributes
     ----------
     game : Game
-        Santorini game of this node
+        Santorini game of this node. Derived from the parent's game and move on first access
     parent : MCTSNode
        Parent node, ie previous game state
+    move : int
+        Code of the move leading from the parent to this node, see moves.py. None for the root
     children : list
         Legal moves following this node. Empty if game is over.
     N : int
@@ -31,19 +51,35 @@ class MCTSNode:
     Q : int
         # of times node has won when simulated
     deleted : bool
-        Not currently in use, could be used to prune trees in the future
+        True once the node has been pruned from the tree to save memory
+    proven : string
+        PROVEN_WIN or PROVEN_LOSS once the outcome of the node is certain for the player who moved into it.
+        None while it still depends on the rollouts
     """
 
-    def __init__(self, root_game, parent, simulation_exception=None):
+    def __init__(self, root_game, parent, simulation_exception=None, move=None):
 
-        self.game = root_game
+        self._game = root_game
         self.parent = parent
+        self.move = move
         self.children = []
         self.N = 0
         self.Q = 0
         self.deleted = False
-        self.early_game_score = 0
+        self.proven = None
+        self.early_game_score = None
+        self.exploration_weight = None  # early_game_score times the exploration factor of its turn
         self.simulation_exception = simulation_exception
+        self._simulation_score = None
+
+    @property
+    def game(self):
+        """Game of this node, built from the parent's game the first time it's needed."""
+        if self._game is None:
+            parent_game = self.parent.game
+            self._game = parent_game.game_deep_copy(parent_game, parent_game.color)
+            self._game.apply_move(decode_move(self.move))
+        return self._game
 
     def __repr__(self):
         """ASCII representation of MCTS Node."""
@@ -55,11 +91,22 @@ class MCTSNode:
                 '%, score: ' + str(round(self.mcts_score, 6)))
 
     @property
-    def mcts_score(self, exploration_factor=EXPLORATION_FACTOR):
-        """Upper confidence bound for this node
+    def mcts_score(self):
+        """Upper confidence bound for this node, see selection_score"""
+        parent_visits = self.parent.N
+        return self.selection_score(parent_visits, log(parent_visits) if parent_visits > 0 else 0.0)
+
+    def selection_score(self, parent_visits, log_parent_visits, exploration_factor=EXPLORATION_FACTOR):
+        """Upper confidence bound for this node.
+        The parent's visits are passed in, so a descent works out their log once for all siblings.
+        The heuristic part of the score is computed on the first visit and kept.
 
         Parameters
         ----------
+        parent_visits : int
+            N of the parent node
+        log_parent_visits : float
+            Natural log of N of the parent node
         exploration_factor : float
             Tradeoff between exploring new nodes and exploring those with high win rates
 
@@ -69,18 +116,26 @@ class MCTSNode:
             Score of given game, highest is chosen for next simulation
         """
 
+        if self.N == 0:  # what to do if node hasn't been visited
+            return float('inf')
+
+        if self.exploration_weight is None:
+            self.exploration_weight = self.establish_exploration_weight(exploration_factor)
+
+        # (win_rate) + (constant * heuristic_score * exploitation)
+        return self.Q / self.N + self.exploration_weight * sqrt(log_parent_visits / self.N)
+
+    def establish_exploration_weight(self, exploration_factor):
+        """Early game score times the exploration factor, which is lowered later in the game."""
         if self.game.turn > 16:
-            exploration_factor = EXPLORATION_FACTOR * 0.50
+            exploration_factor = exploration_factor * 0.50
         elif self.game.turn > 8:
-            exploration_factor = EXPLORATION_FACTOR * 0.75
+            exploration_factor = exploration_factor * 0.75
 
-        if self.N == 0:  # what to do if node hasn't been visited
+        if self.early_game_score is None:
             self.early_game_score = self.establish_model_score()
-            return float('inf')
-        else:
-            # (win_rate) + (constant * heuristic_score * exploitation)
-            return (self.Q / self.N
-                    + self.early_game_score * exploration_factor * sqrt(log(self.parent.N) / self.N))
+
+        return self.early_game_score * exploration_factor
 
     @staticmethod
     def create_potential_moves(node):
@@ -97,125 +152,117 @@ class MCTSNode:
             Children of that node
         """
         potential_move_li = []  # list of legal moves from current game state
-        simulation_exception = None  # extra weight to put on simulation score
 
         # If the game is over, produce no children
         if node.game.winner is not None:
             return potential_move_li
 
-        # Set the correct mover
-        if (node.game.turn + 1) % 2 != 0:
-            move_color = 'W'
-            other_color = 'G'
-        else:
-            move_color = 'G'
-            other_color = 'W'
-
-        winning_move = node.find_losing_spaces(other_color)
-
-        # Check both of the spaces occupied by the player
-        for spot in [(i, j) for i in range(5) for j in range(5) if
-                     node.game.occupants[i*5+j] == move_color]:
-
-            i, j = spot
-
-            # check each possible move
-            for space in node.game.get_movable_spaces(game=node.game, space=(i, j)):
-
-                # Move a copy of the game, as to not impact the game itself
-                new_game = node.game.game_deep_copy(node.game, move_color)
-                new_game.select_worker(move_color, i, j)
-
-                # Since we have at least one legal move, we can change the color and turn
-                new_game.color = move_color
-                new_game.move_worker(space[0], space[1], auto=True)
-
-                # If we find a winning moves, return only that
-                # As such, this assumes that a player will always make a winning move when possible
-                if new_game.is_winning_move():
-                    new_game.winner = move_color
-                    potential_move_li = [MCTSNode(root_game=new_game, parent=node)]
-                    return potential_move_li
-                else:
-                    # given a legal move, check for each possible build
-                    for build in new_game.get_buildable_spaces(new_game, (new_game.col, new_game.row)):
-
-                        simulation_exception = None
-                        if build == winning_move:
-                            simulation_exception = 'block_win'  # block opponent from winning
-                        elif (new_game.levels[new_game.col*5+new_game.row] == 2 and
-                              new_game.levels[build[0]*5+build[1]] == 3):
-                            simulation_exception = 'create_win'  # create winning move
-                        build_game = new_game.game_deep_copy(new_game,
-                                                             new_game.color)
-                        build_game.build_level(build[0], build[1], auto=True)
-                        potential_move_li.append(MCTSNode(root_game=build_game,
-                                                          parent=node,
-                                                          simulation_exception=simulation_exception))
-
+        move_li = legal_moves(node.game)
+        for code in move_li:
+            # If we find a winning move, return only that
+            # As such, this assumes that a player will always make a winning move when possible
+            if is_winning(code):
+                return [MCTSNode(root_game=None, parent=node, move=code)]
+
+        levels = node.game.levels
+        for code in move_li:
+            _, move_to, build_at = decode_move(code)
+            simulation_exception = None  # extra weight to put on simulation score
+            if code & BLOCK_FLAG:
+                simulation_exception = 'block_win'  # block opponent from winning
+            elif levels[move_to] == 2 and levels[build_at] == 3:
+                simulation_exception = 'create_win'  # create winning move
+            potential_move_li.append(MCTSNode(root_game=None, parent=node,
+                                              simulation_exception=simulation_exception, move=code))
+
+        # If no move can be made, player loses
         if len(potential_move_li) == 0:
-            node.game.winner = other_color
+            node.game.winner = 'G' if to_move(node.game) == 'W' else 'W'
 
         return potential_move_li
 
     @property
     def simulation_score(self):
-        """Probability to give to move in simulation decision"""
+        """Probability to give to move in simulation decision. Computed once, it only depends on the move"""
+        if self._simulation_score is None:
+            self._simulation_score = self.establish_simulation_score()
+        return self._simulation_score
+
+    def establish_simulation_score(self):
+        """Work out simulation_score."""
         if self.simulation_exception == 'block_win':
             return 200
-        elif self.simulation_exception == 'create_win':
-            return self.game.get_height_score(self.game.color) + 10
+
+        # Avoid building the game of an unvisited child just to weigh it
+        if self._game is None:
+            height_score = height_score_after(self.parent.game, self.move)
+        else:
+            height_score = self.game.get_height_score(self.game.color)
+
+        if self.simulation_exception == 'create_win':
+            return height_score + 10
         else:
-            return self.game.get_height_score(self.game.color)
+            return height_score
 
-    def establish_model_score(self, how='heuristic'):
+    def establish_model_score(self, how=MODEL_SCORE):
         """
         Provide heuristic score early in the game to check more fruitful moves first.
 
         Parameters
         ----------
         how : string
-            What methodology to use for model score. Heuristic model or ML model
+            What methodology to use for model score. 'heuristic' for the handcrafted model,
+            'ml' for the gradient boosting model of gbm_model (needs joblib and scikit-learn)
 
         Returns
         -------
         score: float
             Win probability of game based on chosen model
         """
-        this_game = self.game
+        return self.model_score(self.game, how)
+
+    @staticmethod
+    def model_score(this_game, how=MODEL_SCORE):
+        """Model score of a game, see establish_model_score. Usable without a node."""
         if this_game.turn > 16:
             return 1
 
-        # Use ML Model
-        # TODO: old code, needs reimplementation — returning None here causes a TypeError in mcts_score
-        # if how == 'ml':
-        #     pass
+        # Use ML Model, one position at a time. TreeSearch.evaluate_batch fills it in for whole batches
+        if how == 'ml':
+            return float(gbm_model.win_probability(this_game))
 
         # Use handcrafted heuristic
         if how == 'heuristic':
-            color = this_game.color
-            player_height_score = 0  # to make height score somewhat match the height score property
-            opponent_color = this_game.opponent_color
-            opponent_height = 0
-            player_spaces = []
-            opponent_spaces = []
-            for col, row in [(i, j) for i in range(5) for j in range(5)]:
-                occ = this_game.occupants[col*5+row]
-                if occ == color:
-                    player_height_score += 2 ** this_game.levels[col*5+row]
-                    player_spaces.append((col, row))
-                elif occ == opponent_color:
-                    opponent_height += this_game.levels[col*5+row]
-                    for col_, row_ in this_game.get_movable_spaces(game=this_game, space=(col, row)):
-                        player_height_score -= this_game.levels[col_*5+row_] // 2
-                    opponent_spaces.append((col, row))
-
-            distance_score = -1 * max(opponent_height, 1) * self.calculate_distance(player_spaces, opponent_spaces)
-
-            # Arithmetic mean of distance and height score
-            score = distance_score / sqrt(16) + player_height_score
-            transform_score = 1 / (1 + exp(score * -1))
-            return transform_score
+            return MCTSNode.heuristic_score(this_game)
+
+        raise ValueError('Unknown model score: ' + str(how))
+
+    @staticmethod
+    def heuristic_score(this_game):
+        """Handcrafted win probability of this_game.color, the heuristic model score at any turn."""
+        color = this_game.color
+        player_height_score = 0  # to make height score somewhat match the height score property
+        opponent_color = this_game.opponent_color
+        opponent_height = 0
+        player_spaces = []
+        opponent_spaces = []
+        for col, row in [(i, j) for i in range(5) for j in range(5)]:
+            occ = this_game.occupants[col*5+row]
+            if occ == color:
+                player_height_score += 2 ** this_game.levels[col*5+row]
+                player_spaces.append((col, row))
+            elif occ == opponent_color:
+                opponent_height += this_game.levels[col*5+row]
+                for col_, row_ in this_game.get_movable_spaces(game=this_game, space=(col, row)):
+                    player_height_score -= this_game.levels[col_*5+row_] // 2
+                opponent_spaces.append((col, row))
+
+        distance_score = -1 * max(opponent_height, 1) * MCTSNode.calculate_distance(player_spaces, opponent_spaces)
+
+        # Arithmetic mean of distance and height score
+        score = distance_score / sqrt(16) + player_height_score
+        transform_score = 1 / (1 + exp(score * -1))
+        return transform_score
 
     @staticmethod
     def calculate_distance(player_spaces, opponent_spaces):
@@ -261,14 +308,19 @@ class MCTSNode:
             Coordinate of winning space that must be blocked. If no such space exists
             returns (-1,-1)
         """
+        return self.losing_space(self.game, other_color)
+
+    @staticmethod
+    def losing_space(game, other_color):
+        """Space the opponent can win at next turn, see find_losing_spaces."""
         win_space = (-1, -1)  # default if no space is found
         threat_count = 0
 
         for i in range(5):
             for j in range(5):
-                if self.game.occupants[i*5+j] == other_color and self.game.levels[i*5+j] == 2:
-                    for col, row in self.game.get_movable_spaces(game=self.game, space=(i, j)):
-                        if self.game.levels[col*5+row] == 3:
+                if game.occupants[i*5+j] == other_color and game.levels[i*5+j] == 2:
+                    for col, row in game.get_movable_spaces(game=game, space=(i, j)):
+                        if game.levels[col*5+row] == 3:
                             threat_count += 1
                             win_space = (col, row)
                             if threat_count > 1:
@@ -297,14 +349,41 @@ class TreeSearch:
     num_rollouts : int
         Number of times a move has been simulated
 
+    max_nodes : int
+        Node budget of the tree, see prune_tree
+
+    node_count : int
+        Number of nodes currently in the tree
+
+    freed_nodes : int
+        Number of nodes pruned since the tree was created
+
+    stop_reason : string
+        Why the last search ended: 'rollouts', 'time', 'proven', 'stopped', or the stopping rule that settled the
+        move ('visit_gap', 'confidence')
+
+    rollout_depth : int
+        Plies each rollout plays before scoring the position with the evaluator, None to play games to the end.
+        Batches play to the end unless it's 0, then the leaves of a batch are scored together, see evaluate_batch.
+        Parallel rollouts always play to the end
+
+    evaluator : string
+        Scores the end of a truncated rollout, see evaluate_position
+
     """
-    def __init__(self, root_game):
+    def __init__(self, root_game, max_nodes=MAX_NODES, rollout_depth=ROLLOUT_DEPTH, evaluator=ROLLOUT_EVALUATOR):
         self.root_game = root_game.game_deep_copy(root_game, root_game.color)
         self.root = MCTSNode(self.root_game, None)
+        self.rollout_depth = rollout_depth
+        self.evaluator = evaluator
         self.run_time_seconds = 0
         self.num_rollouts = 0
+        self.max_nodes = max_nodes
+        self.node_count = 1
+        self.freed_nodes = 0
+        self.stop_reason = None
 
-    def search_tree(self, max_seconds=TURN_TIME):
+    def search_tree(self, max_seconds=TURN_TIME, stop_event=None, batch_size=None, stop_rule=STOP_RULE):
         """
         Search children nodes of tree.
 
@@ -312,20 +391,132 @@ class TreeSearch:
         ----------
         max_seconds : int
             Amount of seconds MCTS algorithm searches for the best move.
+        stop_event : threading.Event, optional
+            Ends the search early once set, used to stop pondering in a background thread
+        batch_size : int, optional
+            Choose this many leaves at a time and simulate them together with batch_rollout (needs NumPy),
+            or score them together with evaluate_batch if rollout_depth is 0.
+            One leaf and one rollout at a time if not given
+        stop_rule : string
+            Ends the search once the best move is settled, see decision_settled. None to use the whole budget
         """
         start_time = time.perf_counter()
         current_time = start_time
         num_rollouts = 0
-        while num_rollouts < MAX_ROLLOUT and (current_time - start_time) < max_seconds:
-            node = self.choose_simulation_node()
-            simulation_game = node.game.game_deep_copy(node.game, node.game.color)
-            winning_color = self.simulate_random_game(simulation_game)
-            self.update_node_info(node, winning_color)
-            num_rollouts += 1
+        stop_reason = self.search_stop_reason(num_rollouts, 0, max_seconds, stop_event)
+        while stop_reason is None:
+            if batch_size is not None and self.rollout_depth == 0:
+                num_rollouts += self.evaluate_batch(min(batch_size, MAX_ROLLOUT - num_rollouts))
+                check_rule = stop_rule
+            elif batch_size is not None:
+                num_rollouts += self.simulate_batch(min(batch_size, MAX_ROLLOUT - num_rollouts))
+                check_rule = stop_rule
+            else:
+                self.playout(self.choose_simulation_node())
+                num_rollouts += 1
+                check_rule = stop_rule if num_rollouts % STOP_CHECK_INTERVAL == 0 else None
             current_time = time.perf_counter()
-        print("rollouts:", num_rollouts)
+            stop_reason = self.search_stop_reason(num_rollouts, current_time - start_time, max_seconds,
+                                                  stop_event, check_rule)
+        print("rollouts:", num_rollouts, stop_reason)
         self.run_time_seconds = current_time - start_time
         self.num_rollouts = num_rollouts
+        self.stop_reason = stop_reason
+
+    def playout(self, node):
+        """Simulate a game from the node and back up its result."""
+        simulation_game = node.game.game_deep_copy(node.game, node.game.color)
+        self.update_node_info(node, self.rollout(simulation_game))
+
+    def rollout(self, simulation_game, played=None):
+        """
+        Play a simulation, to the end or for rollout_depth plies.
+
+        Parameters
+        ----------
+        simulation_game : Game
+            Starting position, played forward in place
+        played : list, optional
+            (color, move code) of every move of the simulation is appended to it
+
+        Returns
+        -------
+        char or float
+            Winner of the game, or White's win probability when it was cut short, see update_node_info
+        """
+        if self.rollout_depth is None:
+            return self.simulate_random_game(simulation_game, played)
+        return self.simulate_truncated_game(simulation_game, self.rollout_depth, self.evaluator, played)
+
+    def search_stop_reason(self, num_rollouts, elapsed, max_seconds, stop_event=None, stop_rule=None):
+        """
+        Check if the search should end.
+
+        Parameters
+        ----------
+        num_rollouts : int
+            Rollouts run so far in this search
+        elapsed : float
+            Seconds searched so far
+        max_seconds : float
+            Time budget of the search
+        stop_event : threading.Event, optional
+            Ends the search once set
+        stop_rule : string, optional
+            Also check if the best move is settled, see decision_settled
+
+        Returns
+        -------
+        string
+            Reason to stop, None to keep searching
+        """
+        if self.root.proven is not None:
+            return 'proven'
+        if num_rollouts >= MAX_ROLLOUT:
+            return 'rollouts'
+        if elapsed >= max_seconds:
+            return 'time'
+        if stop_event is not None and stop_event.is_set():
+            return 'stopped'
+        if stop_rule is None:
+            return None
+
+        # Rollouts still to come, by count or at the current rate until time runs out
+        remaining_rollouts = MAX_ROLLOUT - num_rollouts
+        if elapsed > 0:
+            remaining_rollouts = min(remaining_rollouts, int(num_rollouts / elapsed * (max_seconds - elapsed)) + 1)
+        return decision_settled([(child.N, child.Q, child.proven) for child in self.root.children],
+                                remaining_rollouts, stop_rule)
+
+    def reroot(self, game):
+        """
+        Make the node matching a later position the root, keeping its subtree and statistics.
+        Only nodes that were simulated have a game to compare, unvisited ones have no statistics to keep.
+
+        Parameters
+        ----------
+        game : Game
+            Position to search next, usually the old root after our move and the opponent's reply
+
+        Returns
+        -------
+        bool
+            False if no node within REROOT_DEPTH plies matches, the tree is then left unchanged
+        """
+        frontier = [self.root]
+        for _ in range(REROOT_DEPTH + 1):
+            next_frontier = []
+            for node in frontier:
+                if node._game is not None and node.game.zobrist == game.zobrist and node.game.turn == game.turn:
+                    node.parent = None  # stop backing up into the old tree, and let it be freed
+                    node.game.color = game.color  # same color as a fresh root
+                    self.root = node
+                    self.root_game = node.game
+                    self.node_count = self.count_nodes(node)
+                    return True
+                next_frontier.extend(node.children)
+            frontier = next_frontier
+        return False
 
     def choose_simulation_node(self):
         """Choose a node from which to simulate a game
@@ -335,20 +526,32 @@ class TreeSearch:
         MCTSNode
             Node from which to simulate a game and retrieve results
         """
+        if self.node_count > self.max_nodes:
+            self.prune_tree()
+
         node = self.root
-        max_child_list = []
 
         # loop through potential children until we find a leaf node that doesn't permit further turns
         while len(node.children) > 0:
             max_score = float('-inf')
+            max_child_list = []
+            parent_visits = node.N
+            log_parent_visits = log(parent_visits) if parent_visits > 0 else 0.0
             for child in node.children:
-                current_score = child.mcts_score
+                if child.proven == PROVEN_LOSS:  # never worth choosing
+                    continue
+                current_score = child.selection_score(parent_visits, log_parent_visits)
                 if current_score > max_score:
                     max_child_list = [child]
                     max_score = current_score
                 elif current_score == max_score:
                     max_child_list.append(child)
 
+            # Every move loses, so the node itself is proven. Only reached by the other leaves of a batch
+            # chosen before the root was proven, simulate from here
+            if len(max_child_list) == 0:
+                return node
+
             # If multiple nodes have the max score, we select one according to the simulation score
             node = random.choices(population=max_child_list,
                                   weights=[x.simulation_score for x in max_child_list],
@@ -358,11 +561,89 @@ class TreeSearch:
                 return node
 
         if self.add_children_to_game_tree(node):
+            self.node_count += len(node.children)
+            self.update_proven(node)
             if len(node.children) > 0:
                 node = random.choice(node.children)
 
         return node
 
+    @staticmethod
+    def update_proven(node):
+        """
+        Prove a node that was just expanded, and carry the proof up the tree (MCTS-Solver).
+        A winning move is a proven win, and so is leaving the opponent without moves.
+        A node is a proven loss if the opponent has a proven win among its replies, and a proven win
+        if all of the opponent's replies are proven losses.
+
+        Parameters
+        ----------
+        node : MCTSNode
+            Node whose children were just created
+        """
+        for child in node.children:
+            if is_winning(child.move):
+                child.proven = PROVEN_WIN
+
+        while node is not None and node.proven is None:
+            if len(node.children) == 0:
+                if node.game.winner is None:
+                    return
+                node.proven = PROVEN_WIN if node.game.winner == node.game.color else PROVEN_LOSS
+            elif any(child.proven == PROVEN_WIN for child in node.children):
+                node.proven = PROVEN_LOSS
+            elif all(child.proven == PROVEN_LOSS for child in node.children):
+                node.proven = PROVEN_WIN
+            else:
+                return
+            node = node.parent
+
+    def prune_tree(self):
+        """
+        Free nodes until the tree is back to PRUNE_TARGET of its node budget.
+        The least visited expanded nodes lose their children and become leaves again, keeping their own N and Q.
+        They are expanded again if the search comes back to them. Removed nodes are flagged as deleted.
+        """
+        # Expanded nodes below the root
+        candidates = []
+        stack = list(self.root.children)
+        while len(stack) > 0:
+            node = stack.pop()
+            if len(node.children) > 0:
+                candidates.append(node)
+                stack.extend(node.children)
+
+        target = int(self.max_nodes * PRUNE_TARGET)
+        candidates.sort(key=lambda x: x.N)
+        for node in candidates:
+            if self.node_count <= target:
+                break
+            if node.deleted:  # already removed with an ancestor
+                continue
+
+            # Count the nodes as they're removed, descendants pruned earlier in the pass are already gone
+            freed = 0
+            stack = list(node.children)
+            while len(stack) > 0:
+                child = stack.pop()
+                child.deleted = True
+                freed += 1
+                stack.extend(child.children)
+            node.children = []
+            self.node_count -= freed
+            self.freed_nodes += freed
+
+    @staticmethod
+    def count_nodes(node):
+        """Number of nodes in the subtree of a node, itself included."""
+        count = 0
+        stack = [node]
+        while len(stack) > 0:
+            node = stack.pop()
+            count += 1
+            stack.extend(node.children)
+        return count
+
     @staticmethod
     def add_children_to_game_tree(parent):
         """
@@ -383,16 +664,18 @@ class TreeSearch:
         return True
 
     @staticmethod
-    def simulate_random_game(simulation_game):
+    def simulate_random_game(simulation_game, played=None):
         """
         Find winner of simulated game
         Called 'rollout' in Monte Carlo Tree Search terminology
 
-        This function currently has an awful control structure. Will fix after further testing.
+        The game is played forward in place with apply_move, so pass a copy.
         Attributes
         ----------
         simulation_game : Game object
             starting position of game to simulate
+        played : list, optional
+            (color, move code) of every move of the simulation is appended to it
 
         Returns
         -------
@@ -400,20 +683,97 @@ class TreeSearch:
             color that won the game
         """
 
-        # If no children, the game is done
+        # If no moves are left, the game is done
         while simulation_game.winner is None:
-            new_node = MCTSNode(root_game=simulation_game, parent=None)
-            potential_node_list = new_node.create_potential_moves(new_node)
-            list_len = len(potential_node_list)
+            move_li, weight_li = TreeSearch.weighted_moves(simulation_game)
 
-            if list_len > 0:
-                node_choice = random.choices(population=potential_node_list,
-                                             weights=[x.simulation_score for x in potential_node_list],
-                                             k=1)[0]
-                simulation_game = node_choice.game
+            if len(move_li) > 0:
+                code = random.choices(population=move_li, weights=weight_li, k=1)[0]
+                simulation_game.apply_move(DECODE[code & MOVE_MASK])
+                if played is not None:
+                    played.append((simulation_game.color, code))
 
         return simulation_game.winner
 
+    @staticmethod
+    def simulate_truncated_game(simulation_game, max_plies, evaluator=ROLLOUT_EVALUATOR, played=None):
+        """
+        Rollout that stops after max_plies and scores the position reached, see simulate_random_game.
+
+        Parameters
+        ----------
+        simulation_game : Game object
+            starting position of game to simulate, played forward in place
+        max_plies : int
+            Most moves to play
+        evaluator : string
+            Scores the position if the game isn't over by then, see evaluate_position
+        played : list, optional
+            (color, move code) of every move of the simulation is appended to it
+
+        Returns
+        -------
+        char or float
+            Color that won if the game ended, White's win probability otherwise
+        """
+        for _ in range(max_plies):
+            if simulation_game.winner is not None:
+                return simulation_game.winner
+            move_li, weight_li = TreeSearch.weighted_moves(simulation_game)
+
+            if len(move_li) > 0:
+                code = random.choices(population=move_li, weights=weight_li, k=1)[0]
+                simulation_game.apply_move(DECODE[code & MOVE_MASK])
+                if played is not None:
+                    played.append((simulation_game.color, code))
+
+        if simulation_game.winner is not None:
+            return simulation_game.winner
+        return evaluate_position(simulation_game, evaluator)
+
+    @staticmethod
+    def weighted_moves(game):
+        """
+        Legal moves of the player to move, weighted the same way as MCTSNode.simulation_score.
+        Weights are worked out from the move codes, without playing the moves.
+
+        Parameters
+        ----------
+        game : Game object
+            position to generate moves from. Sets the winner if the player to move is stuck
+
+        Returns
+        -------
+        tuple
+            Move codes and list of their weights.
+            Only the winning move is returned if one exists.
+        """
+        move_color = to_move(game)
+        move_li = legal_moves(game, move_color)
+
+        # If no move can be made, player loses
+        if len(move_li) == 0:
+            game.winner = 'G' if move_color == 'W' else 'W'
+            return move_li, []
+
+        levels = game.levels
+        height_score = game.get_height_score(move_color)
+        weight_li = []
+        for code in move_li:
+            # A player always makes a winning move when possible
+            if code & WIN_FLAG:
+                return [code], [1]
+
+            worker, move_to, build_at = DECODE[code & MOVE_MASK]
+            if code & BLOCK_FLAG:
+                weight_li.append(200)  # block opponent from winning
+            elif levels[move_to] == 2 and levels[build_at] == 3:
+                weight_li.append(height_score + 2 * (2 - levels[worker]) + 10)  # create winning move
+            else:
+                weight_li.append(height_score + 2 * (levels[move_to] - levels[worker]))
+
+        return move_li, weight_li
+
     @staticmethod
     def update_node_info(node, outcome):
         """
@@ -424,15 +784,112 @@ class TreeSearch:
         node : MCTSNode
             Node from which simulation was run
 
-        outcome : char
-            W or G, winner of the simulation game
+        outcome : char or float
+            W or G, winner of the simulation game. White's win probability for a truncated rollout
         """
-        reward = int(outcome == node.game.color)
+        reward = outcome_reward(outcome, node.game.color)
         while node is not None:
             node.N += 1
             node.Q += reward
             node = node.parent  # traverse up the tree
-            reward = int(not reward)  # switch reward for other color
+            reward = 1 - reward  # switch reward for other color
+
+    def simulate_batch(self, batch_size):
+        """
+        Choose several leaves, simulate them all at once and back up the results.
+        Virtual loss keeps the leaves of one batch apart, see add_virtual_loss.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of leaves to simulate
+
+        Returns
+        -------
+        int
+            Number of rollouts played
+        """
+        leaves = []
+        for _ in range(batch_size):
+            if self.root.proven is not None:  # nothing left to search
+                break
+            node = self.choose_simulation_node()
+            self.add_virtual_loss(node)
+            leaves.append(node)
+
+        winners = batch_rollout.simulate_games([node.game for node in leaves], seed=random.getrandbits(64))
+        for node, winning_color in zip(leaves, winners):
+            self.remove_virtual_loss(node)
+            self.update_node_info(node, winning_color)
+        return len(leaves)
+
+    def evaluate_batch(self, batch_size):
+        """
+        Choose several leaves and score them all at once with the evaluator, instead of simulating them.
+        The 'gbm' evaluator predicts the whole batch with one call to the model, and the prediction also
+        becomes the leaf's early_game_score, ie its 'ml' model score, replacing any score set before.
+        Virtual loss keeps the leaves of one batch apart, see add_virtual_loss.
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of leaves to score
+
+        Returns
+        -------
+        int
+            Number of leaves backed up, finished games included
+        """
+        leaves = []
+        num_finished = 0
+        for _ in range(batch_size):
+            if self.root.proven is not None:  # nothing left to search
+                break
+            node = self.choose_simulation_node()
+            if node.game.winner is not None:  # Nothing to score
+                self.update_node_info(node, node.game.winner)
+                num_finished += 1
+                continue
+            self.add_virtual_loss(node)
+            leaves.append(node)
+
+        white_probabilities = evaluate_positions([node.game for node in leaves], self.evaluator)
+        for node, white_probability in zip(leaves, white_probabilities):
+            self.remove_virtual_loss(node)
+            # Same cutoff as MCTSNode.model_score, later turns keep the flat score.
+            # The virtual loss lets later descents of the batch score the leaf with the default model score first,
+            # so the cached exploration weight is reset to pick up the prediction
+            if self.evaluator == 'gbm' and node.game.turn <= 16:
+                node.early_game_score = outcome_reward(white_probability, node.game.color)
+                node.exploration_weight = None
+            self.update_node_info(node, white_probability)
+        return len(leaves) + num_finished
+
+    @staticmethod
+    def add_virtual_loss(node, amount=1):
+        """
+        Count a pending simulation as a loss for every node on the path, so parallel descents
+        spread out instead of all choosing the same leaf. Raising N without Q lowers the win rate
+        of each node for the player who chose it.
+
+        Parameters
+        ----------
+        node : MCTSNode
+            Node the pending simulation was started from
+
+        amount : int
+            Number of losses to add
+        """
+        while node is not None:
+            node.N += amount
+            node = node.parent
+
+    @staticmethod
+    def remove_virtual_loss(node, amount=1):
+        """Undo add_virtual_loss once the simulation result is known."""
+        while node is not None:
+            node.N -= amount
+            node = node.parent
 
     def get_best_move(self):
         """
@@ -444,12 +901,19 @@ class TreeSearch:
             best move, ie highest N
         """
         max_node_list = []
-        max_node_score = 0
+        max_node_score = -1
         if self.root_game.end:
             return None
 
+        # A proven win is played straight away, proven losses only if every move loses
+        candidates = [child for child in self.root.children if child.proven == PROVEN_WIN]
+        if len(candidates) == 0:
+            candidates = [child for child in self.root.children if child.proven != PROVEN_LOSS]
+        if len(candidates) == 0:
+            candidates = self.root.children
+
         # Find child that was visited the most
-        for child in self.root.children:
+        for child in candidates:
             current_score = child.N
             if current_score > max_node_score:
                 max_node_list = [child]
@@ -462,6 +926,122 @@ class TreeSearch:
         return game_choice
 
 
+def outcome_reward(outcome, color):
+    """
+    Reward of a simulation for the given color.
+
+    Parameters
+    ----------
+    outcome : char or float
+        Winner of the simulation, or White's win probability for a truncated rollout
+    color : char
+        Player to reward
+
+    Returns
+    -------
+    int or float
+        1 for a win and 0 for a loss, the win probability of the color for a truncated rollout
+    """
+    if isinstance(outcome, float):
+        return outcome if color == 'W' else 1 - outcome
+    return int(outcome == color)
+
+
+def evaluate_position(game, evaluator=ROLLOUT_EVALUATOR):
+    """
+    White's win probability of an unfinished position.
+    MCTSNode.heuristic_score isn't offered: as a win probability it is further from rollout results than a flat 0.5.
+
+    Parameters
+    ----------
+    game : Game
+        Position to score
+    evaluator : string
+        'minimax': Game.get_minimax_score through a logistic, scaled by MINIMAX_SCALE.
+        'gbm': the gradient boosting model of gbm_model (needs joblib and scikit-learn)
+
+    Returns
+    -------
+    float
+        Probability that White wins
+    """
+    if evaluator == 'minimax':
+        score = max(-700.0, min(700.0, game.get_minimax_score(game.color) / MINIMAX_SCALE))
+        probability = 1 / (1 + exp(-score))
+    elif evaluator == 'gbm':
+        probability = gbm_model.win_probability(game)
+    else:
+        raise ValueError('Unknown rollout evaluator: ' + str(evaluator))
+
+    # Each evaluator scores the position for game.color
+    probability = float(probability)
+    return probability if game.color == 'W' else 1 - probability
+
+
+def evaluate_positions(games, evaluator=ROLLOUT_EVALUATOR):
+    """
+    White's win probability of several unfinished positions, see evaluate_position.
+    The 'gbm' evaluator scores them all with a single call to the model.
+
+    Returns
+    -------
+    list
+        Probability that White wins, for each game
+    """
+    if evaluator != 'gbm':
+        return [evaluate_position(game, evaluator) for game in games]
+
+    probabilities = gbm_model.win_probabilities(games)
+    return [float(probability) if game.color == 'W' else 1 - float(probability)
+            for game, probability in zip(games, probabilities)]
+
+
+def decision_settled(child_stats, remaining_rollouts, stop_rule=STOP_RULE):
+    """
+    Check if more search can still change the move get_best_move picks, ie the most visited root child.
+    Only the children get_best_move can pick are compared, proven losses are left out unless every child is one.
+
+    Parameters
+    ----------
+    child_stats : list
+        (N, Q, proven) of each root child
+    remaining_rollouts : int
+        Most rollouts the search can still run
+    stop_rule : string
+        'visits': settled once the most visited child leads the runner up by more visits than remain.
+        'confidence': also settled once the most visited child's win rate is clearly the best, ie the bottom of its
+        confidence interval is above the top of every other child's
+
+    Returns
+    -------
+    string
+        'proven' if a child is a proven win, 'visit_gap' or 'confidence' if the move is settled, None otherwise
+    """
+    if stop_rule is None:
+        return None
+    if any(proven == PROVEN_WIN for _, _, proven in child_stats):
+        return 'proven'
+
+    candidates = [(visits, wins) for visits, wins, proven in child_stats if proven != PROVEN_LOSS]
+    if len(candidates) == 0:
+        candidates = [(visits, wins) for visits, wins, _ in child_stats]
+    if len(candidates) < 2:
+        return None
+
+    ranked = sorted(candidates, reverse=True)
+    best_visits, best_wins = ranked[0]
+    if best_visits - ranked[1][0] > remaining_rollouts:
+        return 'visit_gap'
+
+    if stop_rule == 'confidence' and ranked[-1][0] > 0:
+        # Widest interval of a win rate, p(1 - p) is at most 1/4
+        best_lower = best_wins / best_visits - CONFIDENCE_Z * 0.5 / sqrt(best_visits)
+        if all(wins / visits + CONFIDENCE_Z * 0.5 / sqrt(visits) < best_lower for visits, wins in ranked[1:]):
+            return 'confidence'
+
+    return None
+
+
 def distance_between(col_0, row_0, col_1, row_1):
     """Geometrics distance between two points"""
     return sqrt((col_0 - col_1) ** 2 + (row_0 - row_1) ** 2)
@@ -1,34 +1,98 @@
-"""Simplified addition of the All Moves as First (AMAF) algorithm to MCTS"""
+"""
+Addition of the All Moves as First (AMAF) algorithm to MCTS.
+Three ways of filling the AMAF statistics of a node, see TreeSearchRave.rave_mode:
+'sibling' shares them between the builds of the same worker move,
+'amaf' credits every move the same color plays later in the simulation, tree and rollout,
+'grave' does the same, but scores moves with the statistics of the closest well visited ancestor.
+"""
 
-import random
-from math import sqrt, log
+from math import sqrt
 
-from MCTS import MCTSNode, TreeSearch
+from MCTS import MCTSNode, TreeSearch, outcome_reward, MAX_NODES, ROLLOUT_DEPTH, ROLLOUT_EVALUATOR
+from moves import legal_moves, decode_move, is_winning, to_move, BLOCK_FLAG, MOVE_MASK
 
 EXPLORATION_FACTOR_RAVE = 2.5  # Parameter that decides tradeoff between exploration and exploitation
 RAVE_EQUILIBRIUM = 50  # Number of moves after which RAVE and MCTS have equal value
+GRAVE_REF = 50  # Visits before a GRAVE node keeps its own AMAF table, and its descendants use it
+GRAY_KEY_OFFSET = 625  # Added to the AMAF key of a gray move, white and gray moves are kept apart
+USE_HISTORY = False  # Keep search wide move statistics and use them as the prior of new nodes, see use_history
+HISTORY_MIN_VISITS = 20  # Simulations a move needs in the history table before it replaces the model score
+
+
+def amaf_key(color, code):
+    """
+    Key under which a move is counted in the AMAF statistics.
+    The same square moved to and built on, by the same color, counts as the same move whichever worker plays it.
+
+    Parameters
+    ----------
+    color : char
+        Player making the move
+    code : int
+        Move code, see moves.py
+
+    Returns
+    -------
+    int
+        move_to * 25 + build_at, plus GRAY_KEY_OFFSET for gray
+    """
+    key = (code & MOVE_MASK) % 625
+    if color == 'G':
+        return key + GRAY_KEY_OFFSET
+    return key
+
+
+class RAVEGroup:
+    """
+    AMAF statistics shared by a group of sibling nodes, so a backup updates one counter per level.
+
+    Attributes
+    ----------
+    N : int
+        Number of simulations counted for the group
+    Q : int
+        Number of those won by the player making the group's moves
+    """
+    __slots__ = ('N', 'Q')  # One per sibling group, keep them small
+
+    def __init__(self):
+        self.N = 0
+        self.Q = 0
 
 
 class RAVENode(MCTSNode):
     """
     MCTS Node altered to account for all moves as first heuristic.
+    The children of a node are grouped by worker move, ie every build after the same move shares its statistics.
 
     Attributes
     ----------
+    rave_group : RAVEGroup
+        AMAF statistics shared with the siblings of the same group. None for the root
+
     RAVE_N : int
-        Number of times node with same parent move has been chosen.
+        Number of times node with same parent move has been chosen, read from rave_group.
 
     RAVE_Q : int
-        Number of times node with same parent has won a simulation game.
+        Number of times node with same parent has won a simulation game, read from rave_group.
 
-    RAVE_id : int
-        Index of parent node. Used to determine if node is sibling of another node.
+    amaf_key : int
+        Key of the move into the node in the AMAF statistics, see amaf_key. None for the root
     """
-    def __init__(self, root_game, parent, simulation_exception=None, rave_id=0):
-        super().__init__(root_game, parent, simulation_exception)
-        self.RAVE_N = 0
-        self.RAVE_Q = 0
-        self.RAVE_id = rave_id
+    group_by_amaf_key = False  # Group children by amaf_key instead of by worker move
+
+    def __init__(self, root_game, parent, simulation_exception=None, rave_group=None, move=None, key=None):
+        super().__init__(root_game, parent, simulation_exception, move)
+        self.rave_group = rave_group
+        self.amaf_key = key
+
+    @property
+    def RAVE_N(self):
+        return self.rave_group.N if self.rave_group is not None else 0
+
+    @property
+    def RAVE_Q(self):
+        return self.rave_group.Q if self.rave_group is not None else 0
 
     def __repr__(self):
         """ASCII representation of MCTS Node."""
@@ -55,78 +119,65 @@ class RAVENode(MCTSNode):
         return_li : list
             Children of that node
         """
-        rave_id = -1  # initialize rave id
         potential_move_li = []  # list of legal moves from current game state
-        simulation_exception = None  # extra weight to put on simulation score
 
         # If the game is over, produce no children
         if node.game.winner is not None:
             return potential_move_li
 
-        # Set the correct mover
-        if (node.game.turn + 1) % 2 != 0:
-            move_color = 'W'
-            other_color = 'G'
-        else:
-            move_color = 'G'
-            other_color = 'W'
-
-        winning_move = node.find_losing_spaces(other_color)
-
-        # Check both of the spaces occupied by the player
-        for spot in [(i, j) for i in range(5) for j in range(5) if
-                     node.game.occupants[i*5+j] == move_color]:
-
-            i, j = spot
-
-            # check each possible move
-            for space in node.game.get_movable_spaces(game=node.game, space=(i, j)):
-
-                # Move a copy of the game, as to not impact the game itself
-                new_game = node.game.game_deep_copy(node.game, move_color)
-                new_game.select_worker(move_color, i, j)
-
-                # Since we have at least one legal move, we can change the color and turn
-                new_game.color = move_color
-                new_game.move_worker(space[0], space[1], auto=True)
-
-                # If we find a winning moves, return only that
-                # As such, this assumes that a player will always make a winning move when possible
-                if new_game.is_winning_move():
-                    new_game.winner = move_color
-                    potential_move_li = [RAVENode(root_game=new_game, parent=node)]
-                    return potential_move_li
-                else:
-                    # given a legal move, check for each possible build
-                    rave_id += 1
-                    for build in new_game.get_buildable_spaces(new_game, (new_game.col, new_game.row)):
-
-                        simulation_exception = None
-                        if build == winning_move:
-                            simulation_exception = 'block_win'  # block opponent from winning
-                        elif (new_game.levels[new_game.col*5+new_game.row] == 2 and
-                              new_game.levels[build[0]*5+build[1]] == 3):
-                            simulation_exception = 'create_win'  # create winning move
-                        build_game = new_game.game_deep_copy(new_game,
-                                                             new_game.color)
-                        build_game.build_level(build[0], build[1], auto=True)
-                        potential_move_li.append(RAVENode(root_game=build_game,
-                                                          parent=node,
-                                                          simulation_exception=simulation_exception,
-                                                          rave_id=rave_id))
+        node_class = type(node)
+        by_amaf_key = node_class.group_by_amaf_key
+        groups = {}  # worker * 25 + move_to, or amaf key, to the group's statistics
+        if by_amaf_key:
+            node.rave_groups = groups
+
+        move_color = to_move(node.game)
+        move_li = legal_moves(node.game, move_color)
+        for code in move_li:
+            # If we find a winning move, return only that
+            # As such, this assumes that a player will always make a winning move when possible
+            if is_winning(code):
+                key = amaf_key(move_color, code)
+                groups[key] = RAVEGroup()
+                return [node_class(root_game=None, parent=node, rave_group=groups[key], move=code, key=key)]
+
+        levels = node.game.levels
+        for code in move_li:
+            worker, move_to, build_at = decode_move(code)
+            key = amaf_key(move_color, code)
+            group_id = key if by_amaf_key else worker * 25 + move_to
+            rave_group = groups.get(group_id)
+            if rave_group is None:
+                rave_group = groups[group_id] = RAVEGroup()
+
+            simulation_exception = None  # extra weight to put on simulation score
+            if code & BLOCK_FLAG:
+                simulation_exception = 'block_win'  # block opponent from winning
+            elif levels[move_to] == 2 and levels[build_at] == 3:
+                simulation_exception = 'create_win'  # create winning move
+            potential_move_li.append(node_class(root_game=None,
+                                                parent=node,
+                                                simulation_exception=simulation_exception,
+                                                rave_group=rave_group,
+                                                move=code,
+                                                key=key))
 
         # If no move can be made, player loses
         if len(potential_move_li) == 0:
-            node.game.winner = other_color
+            node.game.winner = 'G' if move_color == 'W' else 'W'
 
         return potential_move_li
 
-    @property
-    def mcts_score(self, exploration_factor=EXPLORATION_FACTOR_RAVE, rave_equilibrium=RAVE_EQUILIBRIUM):
-        """Upper confidence bound for this node
+    def selection_score(self, parent_visits, log_parent_visits, exploration_factor=EXPLORATION_FACTOR_RAVE,
+                        rave_equilibrium=RAVE_EQUILIBRIUM):
+        """Upper confidence bound for this node, see MCTSNode.selection_score
 
         Parameters
         ----------
+        parent_visits : int
+            N of the parent node
+        log_parent_visits : float
+            Natural log of N of the parent node
         exploration_factor : float
             Tradeoff between exploring new nodes and exploring those with high win rates
 
@@ -140,24 +191,75 @@ class RAVENode(MCTSNode):
             Score of given game, highest is chosen for next simulation
         """
 
+        if self.N == 0:  # what to do if node hasn't been visited
+            return float('inf')
+
+        rave_group = self.rave_group
+        return self.blended_score(parent_visits, log_parent_visits, rave_group.N, rave_group.Q, exploration_factor)
+
+    def blended_score(self, parent_visits, log_parent_visits, rave_visits, rave_wins,
+                      exploration_factor=EXPLORATION_FACTOR_RAVE):
+        """Upper confidence bound of a visited node, mixing its win rate with the given AMAF statistics."""
         # Set exploration factor, want to exploit less earlier in the game
-        if self.game.turn > 16:
-            exploration_factor = EXPLORATION_FACTOR_RAVE * 0.50
-        elif self.game.turn > 8:
-            exploration_factor = EXPLORATION_FACTOR_RAVE * 0.75
+        if self.exploration_weight is None:
+            self.exploration_weight = self.establish_exploration_weight(exploration_factor)
+
+        rave_weight = sqrt(RAVE_EQUILIBRIUM / (3 * parent_visits + RAVE_EQUILIBRIUM))
+        mcts_weight = (1 - rave_weight)
+
+        rave_score = (rave_wins / rave_visits) if rave_visits > 0 else 0
+
+        # (win_rate) + (constant * heuristic_score * exploitation)
+        return ((self.Q / self.N) * mcts_weight + rave_score * rave_weight
+                + self.exploration_weight * sqrt(log_parent_visits / self.N))
+
+
+class AMAFNode(RAVENode):
+    """
+    RAVE node whose children are grouped by amaf_key, ie the moves credited together by an AMAF backup.
+
+    Attributes
+    ----------
+    rave_groups : dict
+        AMAF key to the RAVEGroup of the children making that move. None until the node is expanded
+    """
+    group_by_amaf_key = True
+
+    def __init__(self, root_game, parent, simulation_exception=None, rave_group=None, move=None, key=None):
+        super().__init__(root_game, parent, simulation_exception, rave_group, move, key)
+        self.rave_groups = None
+
 
+class GRAVENode(AMAFNode):
+    """
+    RAVE node scored with the AMAF statistics of its closest ancestor that has GRAVE_REF visits (GRAVE).
+    Deep nodes have few AMAF samples of their own, the ancestor's are less specific but much more numerous.
+
+    Attributes
+    ----------
+    amaf_table : dict
+        AMAF key to [visits, wins] of every move played below this node, by either color. Wins are counted for
+        the color making the move. None until the node reaches GRAVE_REF visits
+    """
+    def __init__(self, root_game, parent, simulation_exception=None, rave_group=None, move=None, key=None):
+        super().__init__(root_game, parent, simulation_exception, rave_group, move, key)
+        self.amaf_table = None
+
+    def selection_score(self, parent_visits, log_parent_visits, exploration_factor=EXPLORATION_FACTOR_RAVE,
+                        rave_equilibrium=RAVE_EQUILIBRIUM):
+        """Upper confidence bound for this node, see RAVENode.selection_score"""
         if self.N == 0:  # what to do if node hasn't been visited
-            self.early_game_score = self.establish_model_score()
             return float('inf')
-        else:
-            rave_weight = sqrt(RAVE_EQUILIBRIUM / (3 * self.parent.N + RAVE_EQUILIBRIUM))
-            mcts_weight = (1 - rave_weight)
 
-            rave_score = (self.RAVE_Q / self.RAVE_N) if self.RAVE_N > 0 else 0
+        reference = self.parent
+        while reference is not None and reference.amaf_table is None:
+            reference = reference.parent
+        if reference is None:  # Nothing well visited yet, use the node's own statistics
+            return self.blended_score(parent_visits, log_parent_visits, self.rave_group.N, self.rave_group.Q,
+                                      exploration_factor)
 
-            # (win_rate) + (constant * heuristic_score * exploitation)
-            return ((self.Q / self.N) * mcts_weight + rave_score * rave_weight
-                    + self.early_game_score * exploration_factor * sqrt(log(self.parent.N) / self.N))
+        rave_visits, rave_wins = reference.amaf_table.get(self.amaf_key, (0, 0))
+        return self.blended_score(parent_visits, log_parent_visits, rave_visits, rave_wins, exploration_factor)
 
 
 class TreeSearchRave(TreeSearch):
@@ -169,13 +271,51 @@ class TreeSearchRave(TreeSearch):
     root : RAVENode
         Node containing the root game
 
-    """
-    def __init__(self, root_game):
-        super().__init__(root_game)
-        self.root = RAVENode(self.root_game, None)
+    rave_mode : string
+        How the AMAF statistics are gathered. Class attribute, set by the subclasses below.
+        'sibling': a result counts for the builds of the same worker move as the move played.
+        'amaf': a result counts for every child whose move is played later by the same color, in the
+        tree or the rollout. Rollouts run in other processes or in batches only report their winner,
+        so only the moves in the tree count for them.
+        'grave': as 'amaf', and nodes are scored with the statistics of a well visited ancestor, see GRAVENode
 
-    @staticmethod
-    def update_node_info(node, outcome):
+    node_class : type
+        Class of the nodes of the tree
+
+    use_history : bool
+        Keep the history table below, and use it as the early game score of new nodes instead of
+        MCTSNode.model_score, on the turns where model_score is used. USE_HISTORY by default, set per tree by
+        Game.play_mcts_turn. Off by default, it made no measurable difference against the same search without it
+
+    history_visits : list
+        Simulations in which each move was played, indexed by amaf_key. Counted across the whole search,
+        whichever position the move was played from, tree and rollout moves alike
+
+    history_wins : list
+        How many of those simulations the player making the move won
+    """
+    rave_mode = 'sibling'
+    node_class = RAVENode
+    use_history = USE_HISTORY
+
+    def __init__(self, root_game, max_nodes=MAX_NODES, rollout_depth=ROLLOUT_DEPTH, evaluator=ROLLOUT_EVALUATOR):
+        super().__init__(root_game, max_nodes, rollout_depth, evaluator)
+        self.root = self.node_class(self.root_game, None)
+        self.history_visits = [0] * (2 * GRAY_KEY_OFFSET)
+        self.history_wins = [0] * (2 * GRAY_KEY_OFFSET)
+
+    def playout(self, node):
+        """Simulate a game from the node and back up its winner, along with the moves played for AMAF."""
+        if self.rave_mode == 'sibling' and not self.use_history:
+            super().playout(node)
+            return
+
+        simulation_game = node.game.game_deep_copy(node.game, node.game.color)
+        played = []
+        outcome = self.rollout(simulation_game, played)
+        self.update_node_info(node, outcome, played)
+
+    def update_node_info(self, node, outcome, played=None):
         """
         Update the node and its parents with its winning percentage.
 
@@ -184,34 +324,97 @@ class TreeSearchRave(TreeSearch):
         node : MCTSNode
             Node from which simulation was run
 
-        outcome : char
-            W or G, winner of the simulation game
+        outcome : char or float
+            W or G, winner of the simulation game. White's win probability for a truncated rollout
+
+        played : list, optional
+            (color, move code) of the rollout moves, see TreeSearch.simulate_random_game.
+            Used by the 'amaf' and 'grave' modes and the history table
+        """
+        reward = outcome_reward(outcome, node.game.color)
+        later_keys = {amaf_key(color, code) for color, code in played} if played else set()
+        if self.rave_mode != 'sibling':
+            self.update_amaf_info(node, outcome, reward, later_keys)
+        else:
+            while node is not None:
+                node.N += 1
+                node.Q += reward
+
+                # Credit the node's siblings through their shared group
+                rave_group = node.rave_group
+                if rave_group is not None:
+                    rave_group.N += 1
+                    rave_group.Q += reward
+                    if node.parent is not None:
+                        later_keys.add(node.amaf_key)
+
+                node = node.parent  # traverse up the tree
+                reward = 1 - reward  # switch reward for other color
+
+        if self.use_history:
+            self.update_history(later_keys, outcome)
+
+    def update_history(self, keys, outcome):
+        """Count a simulation for every move played in it, see history_visits."""
+        white_reward = outcome_reward(outcome, 'W')
+        history_visits = self.history_visits
+        history_wins = self.history_wins
+        for key in keys:
+            history_visits[key] += 1
+            history_wins[key] += white_reward if key < GRAY_KEY_OFFSET else 1 - white_reward
+
+    def history_prior(self, key):
+        """Smoothed win rate of a move in the history table, None until it has HISTORY_MIN_VISITS."""
+        visits = self.history_visits[key]
+        if visits < HISTORY_MIN_VISITS:
+            return None
+        return (self.history_wins[key] + 1) / (visits + 2)
+
+    def update_amaf_info(self, node, outcome, reward, later_keys):
+        """
+        Back up a result for the 'amaf' and 'grave' modes, see update_node_info.
+        Going up the tree, the moves played from each node onwards are collected in later_keys, and every
+        child of the node with one of those moves is credited. In 'grave' mode, the AMAF table of the node is
+        updated as well.
         """
-        reward = int(outcome == node.game.color)
+        white_reward = outcome_reward(outcome, 'W')
+        grave = self.rave_mode == 'grave'
 
         while node is not None:
             node.N += 1
             node.Q += reward
 
-            # See if child node has siblings to loop through
-            if node.parent is None:
-                siblings = []
-            else:
-                siblings = node.parent.children
-
-            for child in siblings:
-                if child.RAVE_id == node.RAVE_id:
-                    child.RAVE_N += 1
-                    child.RAVE_Q += reward
-
-            node = node.parent  # traverse up the tree
-            reward = int(not reward)  # switch reward for other color
-
-    @staticmethod
-    def add_children_to_game_tree(parent):
+            parent = node.parent
+            if parent is not None:
+                later_keys.add(node.amaf_key)
+                groups = parent.rave_groups
+                for key in later_keys:
+                    rave_group = groups.get(key)
+                    if rave_group is not None:
+                        rave_group.N += 1
+                        rave_group.Q += reward
+
+                if grave:
+                    if parent.amaf_table is None and parent.N + 1 >= GRAVE_REF:
+                        parent.amaf_table = {}
+                    if parent.amaf_table is not None:
+                        table = parent.amaf_table
+                        for key in later_keys:
+                            stats = table.get(key)
+                            if stats is None:
+                                stats = table[key] = [0, 0]
+                            stats[0] += 1
+                            stats[1] += white_reward if key < GRAY_KEY_OFFSET else 1 - white_reward
+
+            node = parent  # traverse up the tree
+            reward = 1 - reward  # switch reward for other color
+
+    def add_children_to_game_tree(self, parent):
         """
         Create children of parent node, add them to game tree.
         "Expand" in MCTS terminology
+        With use_history, children whose move is in the history table get it as their early game score,
+        up to turn 16 like MCTSNode.model_score. Later children keep its flat score.
 
         Returns
         -------
@@ -224,63 +427,22 @@ class TreeSearchRave(TreeSearch):
             return False
 
         parent.children = parent.create_potential_moves(parent)
+        if self.use_history and parent.game.turn + 1 <= 16:
+            for child in parent.children:
+                child.early_game_score = self.history_prior(child.amaf_key)
         return True
 
-    @staticmethod
-    def simulate_random_game(simulation_game):
-        """
-        Find winner of simulated game
-        Called 'rollout' in Monte Carlo Tree Search terminology
 
-        This function currently has an awful control structure. Will fix after further testing.
-        Attributes
-        ----------
-        simulation_game : Game object
-            starting position of game to simulate
+class TreeSearchAmaf(TreeSearchRave):
+    """TreeSearchRave crediting every move played later in the simulation, see TreeSearchRave.rave_mode"""
+    rave_mode = 'amaf'
+    node_class = AMAFNode
 
-        Returns
-        -------
-        char
-            color that won the game
-        """
-
-        # If no children, the game is done
-        while simulation_game.winner is None:
-            new_node = RAVENode(root_game=simulation_game, parent=None)
-            potential_node_list = new_node.create_potential_moves(new_node)
-            list_len = len(potential_node_list)
-
-            if list_len > 0:
-                node_choice = random.choices(population=potential_node_list,
-                                             weights=[x.simulation_score for x in potential_node_list],
-                                             k=1)[0]
-                simulation_game = node_choice.game
 
-        return simulation_game.winner
-
-    def get_best_move(self):
-        """
-        Get the best move (ie, one chosen the most) in the current tree
+class TreeSearchGrave(TreeSearchRave):
+    """TreeSearchRave with GRAVE scoring, see TreeSearchRave.rave_mode"""
+    rave_mode = 'grave'
+    node_class = GRAVENode
 
-        Returns
-        -------
-        Game
-            best move, ie highest N
-        """
-        max_node_list = []
-        max_node_score = 0
-        if self.root_game.end:
-            return None
 
-        # Find child that was visited the most
-        for child in self.root.children:
-            current_score = child.N
-            if current_score > max_node_score:
-                max_node_list = [child]
-                max_node_score = current_score
-            elif current_score == max_node_score:
-                max_node_list.append(child)
-
-        game_choice = random.choice(max_node_list)
-        print(game_choice, "turn:", game_choice.parent.game.turn)
-        return game_choice
+RAVE_CLASSES = {'sibling': TreeSearchRave, 'amaf': TreeSearchAmaf, 'grave': TreeSearchGrave}
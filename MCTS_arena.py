@@ -0,0 +1,421 @@
+"""
+MCTS with the tree stored in parallel typed arrays instead of node objects.
+Nodes hold no game: the position of a node is rebuilt by replaying the moves on its path from the root,
+so a node costs a few dozen bytes instead of a full Game copy.
+"""
+
+import random
+import time
+from array import array
+from math import sqrt, log
+
+from MCTS import MCTSNode, TreeSearch, EXPLORATION_FACTOR, TURN_TIME, REROOT_DEPTH, STOP_RULE, STOP_CHECK_INTERVAL
+from moves import legal_moves, decode_move, height_score_after, is_winning, to_move, BLOCK_FLAG
+
+NO_PRIOR = -1.0  # Prior of a node whose early game score hasn't been computed yet
+NO_EXCEPTION = 0  # Values of the exception array, see MCTSNode.simulation_exception
+BLOCK_WIN = 1
+CREATE_WIN = 2
+
+
+class ArenaTreeSearch:
+    """
+    Runs plain MCTS given a starting position, with the tree stored in typed arrays instead of MCTSNode objects.
+    Selection, expansion and rollouts follow TreeSearch, but there's no MCTS-Solver, pruning, RAVE or truncated
+    rollouts.
+    Node i of the tree is the i-th entry of every array below. Children of a node are stored next to each other.
+
+    Attributes
+    ----------
+    root_game : Game
+        Starting position of the game in the tree. All other moves are descendants of this move
+    visits : array
+        N of each node
+    wins : array
+        Q of each node
+    prior : array
+        Early game score of each node, NO_PRIOR until needed
+    parent : array
+        Index of the parent node, -1 for the root
+    first_child : array
+        Index of the first child, -1 until the node is expanded
+    child_count : array
+        Number of children
+    move : array
+        Code of the move leading from the parent to the node, see moves.py
+    exception : array
+        NO_EXCEPTION, BLOCK_WIN or CREATE_WIN
+    run_time_seconds : int
+        Maximum amount of time tree can spend searching for the best move
+    num_rollouts : int
+        Number of times a move has been simulated
+    freed_nodes : int
+        Always 0, the arena isn't pruned. Kept for the same stats as TreeSearch
+    stop_reason : string
+        Why the last search ended, see TreeSearch.stop_reason. Never 'proven', the arena has no solver
+    """
+    def __init__(self, root_game):
+        self.root_game = root_game.game_deep_copy(root_game, root_game.color)
+        self.clear_arrays()
+        self.append_node(-1, 0, NO_EXCEPTION)
+        self.run_time_seconds = 0
+        self.num_rollouts = 0
+        self.freed_nodes = 0
+        self.stop_reason = None
+
+    def __len__(self):
+        return len(self.visits)
+
+    @property
+    def node_count(self):
+        return len(self.visits)
+
+    @property
+    def root(self):
+        """Root node, as an ArenaNode."""
+        return ArenaNode(self, 0)
+
+    def search_tree(self, max_seconds=TURN_TIME, stop_event=None, stop_rule=STOP_RULE):
+        """
+        Search children nodes of tree.
+
+        Parameters
+        ----------
+        max_seconds : int
+            Amount of seconds MCTS algorithm searches for the best move.
+        stop_event : threading.Event, optional
+            Ends the search early once set
+        stop_rule : string
+            Ends the search once the best move is settled, see TreeSearch.search_tree
+        """
+        start_time = time.perf_counter()
+        current_time = start_time
+        num_rollouts = 0
+        stop_reason = self.search_stop_reason(num_rollouts, 0, max_seconds, stop_event)
+        while stop_reason is None:
+            node, simulation_game = self.choose_simulation_node()
+            color = simulation_game.color  # player who moved into the node
+            winning_color = TreeSearch.simulate_random_game(simulation_game)
+            self.update_node_info(node, winning_color == color)
+            num_rollouts += 1
+            current_time = time.perf_counter()
+            check_rule = stop_rule if num_rollouts % STOP_CHECK_INTERVAL == 0 else None
+            stop_reason = self.search_stop_reason(num_rollouts, current_time - start_time, max_seconds,
+                                                  stop_event, check_rule)
+        print("rollouts:", num_rollouts, stop_reason)
+        self.run_time_seconds = current_time - start_time
+        self.num_rollouts = num_rollouts
+        self.stop_reason = stop_reason
+
+    # Same checks as TreeSearch, through the root and children views of ArenaNode
+    search_stop_reason = TreeSearch.search_stop_reason
+
+    def choose_simulation_node(self):
+        """
+        Choose a node from which to simulate a game, see TreeSearch.choose_simulation_node.
+
+        Returns
+        -------
+        tuple
+            Index of the node, and a new game of its position to simulate from
+        """
+        game = self.root_game.game_deep_copy(self.root_game, self.root_game.color)
+        node = 0
+
+        # loop through potential children until we find a leaf node that doesn't permit further turns
+        while self.child_count[node] > 0:
+            first = self.first_child[node]
+            max_score = float('-inf')
+            max_child_list = []
+            for child in range(first, first + self.child_count[node]):
+                current_score = self.mcts_score(child, game)
+                if current_score > max_score:
+                    max_child_list = [child]
+                    max_score = current_score
+                elif current_score == max_score:
+                    max_child_list.append(child)
+
+            # If multiple nodes have the max score, we select one according to the simulation score
+            node = random.choices(population=max_child_list,
+                                  weights=[self.simulation_score(x, game) for x in max_child_list],
+                                  k=1)[0]
+            game.apply_move(decode_move(self.move[node]))
+
+            if self.visits[node] == 0:
+                return node, game
+
+        if self.add_children_to_game_tree(node, game):
+            if self.child_count[node] > 0:
+                first = self.first_child[node]
+                node = random.choice(range(first, first + self.child_count[node]))
+                game.apply_move(decode_move(self.move[node]))
+
+        return node, game
+
+    def add_children_to_game_tree(self, parent, game):
+        """
+        Append the children of a node to the arrays, see MCTSNode.create_potential_moves.
+
+        Parameters
+        ----------
+        parent : int
+            Index of the node to expand
+        game : Game
+            Position of that node. Its winner is set if the player to move is stuck
+
+        Returns
+        -------
+        bool
+            false if the game is over
+        """
+        if game.winner is not None:
+            # don't expand a finished game
+            return False
+
+        move_li = legal_moves(game)
+        for code in move_li:
+            # A player always makes a winning move when possible
+            if is_winning(code):
+                move_li = [code]
+                break
+
+        levels = game.levels
+        self.first_child[parent] = len(self.visits)
+        self.child_count[parent] = len(move_li)
+        for code in move_li:
+            _, move_to, build_at = decode_move(code)
+            if code & BLOCK_FLAG:
+                exception = BLOCK_WIN
+            elif build_at is not None and levels[move_to] == 2 and levels[build_at] == 3:
+                exception = CREATE_WIN
+            else:
+                exception = NO_EXCEPTION
+            self.append_node(parent, code, exception)
+
+        # If no move can be made, player loses
+        if len(move_li) == 0:
+            game.winner = 'G' if to_move(game) == 'W' else 'W'
+
+        return True
+
+    def clear_arrays(self):
+        """Replace the arrays with empty ones."""
+        self.visits = array('i')
+        self.wins = array('i')
+        self.prior = array('d')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.child_count = array('H')
+        self.move = array('H')
+        self.exception = array('b')
+
+    def append_node(self, parent, code, exception, visits=0, wins=0, prior=NO_PRIOR):
+        """Add a node at the end of the arrays, and return its index."""
+        self.visits.append(visits)
+        self.wins.append(wins)
+        self.prior.append(prior)
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.child_count.append(0)
+        self.move.append(code)
+        self.exception.append(exception)
+        return len(self.visits) - 1
+
+    def mcts_score(self, node, parent_game):
+        """
+        Upper confidence bound of a node, see MCTSNode.mcts_score.
+
+        Parameters
+        ----------
+        node : int
+            Index of the node
+        parent_game : Game
+            Position of its parent, used to compute the prior the first time it's needed
+
+        Returns
+        -------
+        float
+            Score of given node, highest is chosen for next simulation
+        """
+        visits = self.visits[node]
+        if visits == 0:  # what to do if node hasn't been visited
+            return float('inf')
+
+        exploration_factor = EXPLORATION_FACTOR
+        if parent_game.turn + 1 > 16:
+            exploration_factor = EXPLORATION_FACTOR * 0.50
+        elif parent_game.turn + 1 > 8:
+            exploration_factor = EXPLORATION_FACTOR * 0.75
+
+        prior = self.prior[node]
+        if prior == NO_PRIOR:
+            record = parent_game.apply_move(decode_move(self.move[node]))
+            prior = self.prior[node] = MCTSNode.model_score(parent_game)
+            parent_game.undo_move(record)
+
+        # (win_rate) + (constant * heuristic_score * exploitation)
+        return (self.wins[node] / visits
+                + prior * exploration_factor * sqrt(log(self.visits[self.parent[node]]) / visits))
+
+    def simulation_score(self, node, parent_game):
+        """Probability to give to move in simulation decision, see MCTSNode.simulation_score"""
+        if self.exception[node] == BLOCK_WIN:
+            return 200
+
+        height_score = height_score_after(parent_game, self.move[node])
+        if self.exception[node] == CREATE_WIN:
+            return height_score + 10
+        else:
+            return height_score
+
+    def update_node_info(self, node, won):
+        """
+        Update the node and its parents with its winning percentage.
+
+        Parameters
+        ----------
+        node : int
+            Index of the node from which simulation was run
+
+        won : bool
+            True if the player who moved into the node won the simulation game
+        """
+        reward = int(won)
+        while node != -1:
+            self.visits[node] += 1
+            self.wins[node] += reward
+            node = self.parent[node]  # traverse up the tree
+            reward = int(not reward)  # switch reward for other color
+
+    def reroot(self, game):
+        """
+        Keep only the subtree of the node matching a later position, see TreeSearch.reroot.
+        The subtree is copied into new arrays, so the rest of the tree is freed.
+
+        Parameters
+        ----------
+        game : Game
+            Position to search next
+
+        Returns
+        -------
+        bool
+            False if no simulated node within REROOT_DEPTH plies matches, the tree is then left unchanged
+        """
+        frontier = [(0, self.root_game.game_deep_copy(self.root_game, self.root_game.color))]
+        for _ in range(REROOT_DEPTH + 1):
+            next_frontier = []
+            for node, node_game in frontier:
+                if node_game.zobrist == game.zobrist and node_game.turn == game.turn:
+                    self.keep_subtree(node)
+                    self.root_game = game.game_deep_copy(game, game.color)
+                    return True
+                if self.child_count[node] == 0:
+                    continue
+                first = self.first_child[node]
+                for child in range(first, first + self.child_count[node]):
+                    if self.visits[child] > 0:
+                        child_game = node_game.game_deep_copy(node_game, node_game.color)
+                        child_game.apply_move(decode_move(self.move[child]))
+                        next_frontier.append((child, child_game))
+            frontier = next_frontier
+        return False
+
+    def keep_subtree(self, new_root):
+        """Rebuild the arrays with only the given node and its descendants, the node becoming index 0."""
+        old_visits, old_wins, old_prior = self.visits, self.wins, self.prior
+        old_first_child, old_child_count = self.first_child, self.child_count
+        old_move, old_exception = self.move, self.exception
+        self.clear_arrays()
+
+        self.append_node(-1, old_move[new_root], old_exception[new_root], old_visits[new_root],
+                         old_wins[new_root], old_prior[new_root])
+        queue = [(new_root, 0)]
+        for old_node, new_node in queue:  # grows while iterating, breadth first
+            old_first = old_first_child[old_node]
+            if old_first == -1:
+                continue
+            self.first_child[new_node] = len(self.visits)
+            self.child_count[new_node] = old_child_count[old_node]
+            for old_child in range(old_first, old_first + old_child_count[old_node]):
+                new_child = self.append_node(new_node, old_move[old_child], old_exception[old_child],
+                                             old_visits[old_child], old_wins[old_child], old_prior[old_child])
+                queue.append((old_child, new_child))
+
+    # Most visited root child, through the ArenaNode views. No child is proven, so it's picked by N alone
+    get_best_move = TreeSearch.get_best_move
+
+
+class ArenaNode:
+    """
+    View of one node of an ArenaTreeSearch, with the MCTSNode attributes read outside the search.
+
+    Attributes
+    ----------
+    tree : ArenaTreeSearch
+        Tree holding the node
+    index : int
+        Index of the node in the tree's arrays
+    """
+    proven = None  # The arena doesn't run the MCTS-Solver
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+        self._game = None
+
+    @property
+    def N(self):
+        return self.tree.visits[self.index]
+
+    @property
+    def Q(self):
+        return self.tree.wins[self.index]
+
+    @property
+    def move(self):
+        return self.tree.move[self.index] if self.index != 0 else None
+
+    @property
+    def parent(self):
+        parent = self.tree.parent[self.index]
+        return ArenaNode(self.tree, parent) if parent != -1 else None
+
+    @property
+    def children(self):
+        if self.tree.child_count[self.index] == 0:
+            return []
+        first = self.tree.first_child[self.index]
+        return [ArenaNode(self.tree, child) for child in range(first, first + self.tree.child_count[self.index])]
+
+    @property
+    def game(self):
+        """Game of this node, rebuilt from the moves on the path from the root."""
+        if self._game is None:
+            path = []
+            node = self.index
+            while node != 0:
+                path.append(self.tree.move[node])
+                node = self.tree.parent[node]
+
+            root_game = self.tree.root_game
+            self._game = root_game.game_deep_copy(root_game, root_game.color)
+            for code in reversed(path):
+                self._game.apply_move(decode_move(code))
+        return self._game
+
+    @property
+    def mcts_score(self):
+        """Upper confidence bound for this node, see MCTSNode.mcts_score"""
+        if self.index == 0:
+            return float('inf')
+        return self.tree.mcts_score(self.index, self.parent.game)
+
+    def __repr__(self):
+        """ASCII representation of MCTS Node."""
+        if self.N == 0 or self.index == 0:
+            return str(self.game) + self.game.color
+
+        return (str(self.game) + self.game.color + '\n' + str(self.Q) + '/' + str(self.N) + ' '
+                + str(round(100 * self.Q / self.N, 1)) +
+                '%, score: ' + str(round(self.mcts_score, 6)))
@@ -0,0 +1,314 @@
+"""
+Parallel MCTS.
+Root parallel: independent trees are grown from the same position in worker processes,
+and the statistics of their root children are added together before choosing a move.
+Tree parallel: one tree stays in this process, and only the rollouts are sent to worker processes.
+"""
+
+import random
+import time
+from multiprocessing import Pool, cpu_count
+from queue import Queue
+
+from MCTS import TreeSearch, TURN_TIME, STOP_RULE, STOP_CHECK_INTERVAL, PROVEN_WIN
+
+STAT_FIELDS = ('N', 'Q')  # Node counters summed across trees
+VIRTUAL_LOSS = 1  # Losses counted on the path of each pending rollout
+ROLLOUTS_PER_WORKER = 2  # Pending rollouts per worker, keeps workers busy while the tree is descended
+
+
+class RootParallelSearch:
+    """
+    Runs several trees of the same search class in parallel and merges their root children.
+    Exposes the same search_tree / get_best_move interface as TreeSearch.
+
+    Attributes
+    ----------
+    tree : TreeSearch
+        Tree holding the merged statistics. Only its root and root children are filled in
+    workers : int
+        Number of processes, ie number of independent trees
+    root_game : Game
+        Starting position of the search
+    root : MCTSNode
+        Root of the merged tree
+    run_time_seconds : float
+        Wall clock time spent searching
+    num_rollouts : int
+        Rollouts summed over every tree
+    rollouts_per_worker : list
+        Rollouts of each tree
+    node_count : int
+        Nodes summed over every tree
+    freed_nodes : int
+        Nodes pruned, summed over every tree
+    stop_reason : string
+        Most common reason the trees stopped searching, see TreeSearch.stop_reason
+    """
+    def __init__(self, root_game, tree_class=TreeSearch, workers=None):
+        self.tree = tree_class(root_game)
+        self.tree_class = tree_class
+        self.workers = workers if workers is not None else cpu_count()
+        self.run_time_seconds = 0
+        self.num_rollouts = 0
+        self.rollouts_per_worker = []
+        self.node_count = 1
+        self.freed_nodes = 0
+        self.stop_reason = None
+
+    @property
+    def root_game(self):
+        return self.tree.root_game
+
+    @property
+    def root(self):
+        return self.tree.root
+
+    def search_tree(self, max_seconds=TURN_TIME, stop_rule=STOP_RULE):
+        """
+        Search one tree per worker, then merge the root children into self.tree.
+        A root child proven in any tree is proven in the merged tree, a win taking precedence.
+
+        Parameters
+        ----------
+        max_seconds : int
+            Amount of seconds each tree searches for the best move.
+        stop_rule : string
+            Stopping rule of each tree, see TreeSearch.search_tree
+        """
+        start_time = time.perf_counter()
+        if not self.tree.add_children_to_game_tree(self.root):
+            return
+
+        # Every tree needs its own seed, or the forked processes would all play the same rollouts
+        tasks = [(self.root_game, self.tree_class, max_seconds, stop_rule, random.getrandbits(32))
+                 for _ in range(self.workers)]
+        with Pool(processes=self.workers) as pool:
+            results = pool.map(search_one_tree, tasks)
+
+        # Children are generated in the same order in every process, so the move code identifies them
+        children = {child.move: child for child in self.root.children}
+        self.rollouts_per_worker = []
+        self.node_count = 0
+        self.freed_nodes = 0
+        stop_reasons = []
+        for (num_rollouts, node_count, freed_nodes, stop_reason, root_stats, child_stats, rave_stats,
+             child_proven) in results:
+            self.rollouts_per_worker.append(num_rollouts)
+            stop_reasons.append(stop_reason)
+            self.node_count += node_count
+            self.freed_nodes += freed_nodes
+            add_stats(self.root, root_stats)
+            for move, stats in child_stats.items():
+                add_stats(children[move], stats)
+            for move, (rave_visits, rave_wins) in rave_stats.items():
+                rave_group = children[move].rave_group
+                rave_group.N += rave_visits
+                rave_group.Q += rave_wins
+            # A proof holds in every tree, and a win is what get_best_move looks for first
+            for move, proven in child_proven.items():
+                if children[move].proven != PROVEN_WIN:
+                    children[move].proven = proven
+
+        self.tree.update_proven(self.root)
+        self.num_rollouts = sum(self.rollouts_per_worker)
+        self.stop_reason = max(stop_reasons, key=stop_reasons.count)
+        self.run_time_seconds = time.perf_counter() - start_time
+        print("rollouts:", self.num_rollouts, self.rollouts_per_worker)
+
+    def get_best_move(self):
+        """Most visited root child over all trees, see TreeSearch.get_best_move."""
+        return self.tree.get_best_move()
+
+
+class TreeParallelSearch:
+    """
+    Runs one tree while rollouts are simulated in a process pool.
+    Several leaves are chosen before their results come back; virtual loss on the path of every
+    pending rollout keeps the descents from all picking the same leaf.
+    Exposes the same search_tree / get_best_move interface as TreeSearch.
+
+    Attributes
+    ----------
+    tree : TreeSearch
+        The searched tree. An existing tree can be passed in to keep searching it
+    workers : int
+        Number of rollout processes
+    virtual_loss : int
+        Losses counted on the path of each pending rollout
+    root_game : Game
+        Starting position of the search
+    root : MCTSNode
+        Root of the tree
+    run_time_seconds : float
+        Wall clock time spent searching
+    num_rollouts : int
+        Number of rollouts backed up into the tree
+    """
+    def __init__(self, root_game, tree_class=TreeSearch, workers=None, virtual_loss=VIRTUAL_LOSS, tree=None):
+        self.tree = tree if tree is not None else tree_class(root_game)
+        self.tree_class = tree_class
+        self.workers = workers if workers is not None else cpu_count()
+        self.virtual_loss = virtual_loss
+        self.run_time_seconds = 0
+        self.num_rollouts = 0
+
+    @property
+    def root_game(self):
+        return self.tree.root_game
+
+    @property
+    def root(self):
+        return self.tree.root
+
+    @property
+    def node_count(self):
+        return self.tree.node_count
+
+    @property
+    def freed_nodes(self):
+        return self.tree.freed_nodes
+
+    @property
+    def stop_reason(self):
+        return self.tree.stop_reason
+
+    def search_tree(self, max_seconds=TURN_TIME, stop_rule=STOP_RULE):
+        """
+        Search the tree, with up to ROLLOUTS_PER_WORKER pending rollouts per worker.
+
+        Parameters
+        ----------
+        max_seconds : int
+            Amount of seconds MCTS algorithm searches for the best move.
+        stop_rule : string
+            Ends the search once the best move is settled, see TreeSearch.search_tree
+        """
+        start_time = time.perf_counter()
+        finished = Queue()  # (node, winner) filled by the pool's result thread
+        max_pending = self.workers * ROLLOUTS_PER_WORKER
+        pending = 0
+        num_rollouts = 0
+        next_check = STOP_CHECK_INTERVAL
+
+        with Pool(processes=self.workers, initializer=random.seed) as pool:
+            while True:
+                # Back up every result that's already in, so descents see the freshest statistics
+                while pending > 0 and (not finished.empty() or pending == max_pending):
+                    self.back_up(*finished.get())
+                    pending -= 1
+                    num_rollouts += 1
+
+                check_rule = None
+                if num_rollouts >= next_check:
+                    check_rule = stop_rule
+                    next_check += STOP_CHECK_INTERVAL
+                stop_reason = self.tree.search_stop_reason(num_rollouts + pending, time.perf_counter() - start_time,
+                                                           max_seconds, stop_rule=check_rule)
+                if stop_reason is not None:
+                    break
+
+                node = self.tree.choose_simulation_node()
+                if node.game.winner is not None:  # Nothing to simulate
+                    self.tree.update_node_info(node, node.game.winner)
+                    num_rollouts += 1
+                    continue
+
+                self.tree.add_virtual_loss(node, self.virtual_loss)
+                simulation_game = node.game.game_deep_copy(node.game, node.game.color)
+                pool.apply_async(run_rollout, ((self.tree_class, simulation_game),),
+                                 callback=lambda winner, leaf=node: finished.put((leaf, winner)),
+                                 error_callback=lambda error, leaf=node: finished.put((leaf, error)))
+                pending += 1
+
+            # Let the rollouts already started count
+            while pending > 0:
+                self.back_up(*finished.get())
+                pending -= 1
+                num_rollouts += 1
+
+        print("rollouts:", num_rollouts, stop_reason)
+        self.run_time_seconds = time.perf_counter() - start_time
+        self.num_rollouts = num_rollouts
+        self.tree.stop_reason = stop_reason
+
+    def back_up(self, node, winner):
+        """Replace the virtual loss of a finished rollout with its result."""
+        if isinstance(winner, BaseException):
+            raise winner
+        self.tree.remove_virtual_loss(node, self.virtual_loss)
+        self.tree.update_node_info(node, winner)
+
+    def get_best_move(self):
+        """Most visited root child, see TreeSearch.get_best_move."""
+        return self.tree.get_best_move()
+
+
+def run_rollout(task):
+    """
+    Pool worker of TreeParallelSearch.
+
+    Parameters
+    ----------
+    task : tuple
+        Search class and game to simulate from
+
+    Returns
+    -------
+    char
+        Color that won the simulated game
+    """
+    tree_class, simulation_game = task
+    return tree_class.simulate_random_game(simulation_game)
+
+
+def search_one_tree(task):
+    """
+    Pool worker of RootParallelSearch.
+
+    Parameters
+    ----------
+    task : tuple
+        Root game, search class, seconds to search, stopping rule and random seed
+
+    Returns
+    -------
+    tuple
+        Number of rollouts, node count, freed node count, stop reason, root statistics, dictionary of root child
+        move code to statistics, dictionary of move code to (N, Q) of each RAVE group of the root children,
+        see rave_group_stats, and dictionary of move code to the proven value of each proven root child
+    """
+    root_game, tree_class, max_seconds, stop_rule, seed = task
+    random.seed(seed)
+    tree = tree_class(root_game)
+    tree.search_tree(max_seconds, stop_rule=stop_rule)
+    return (tree.num_rollouts, tree.node_count, tree.freed_nodes, tree.stop_reason, node_stats(tree.root),
+            {child.move: node_stats(child) for child in tree.root.children}, rave_group_stats(tree.root.children),
+            {child.move: child.proven for child in tree.root.children if child.proven is not None})
+
+
+def node_stats(node):
+    """Counters of a node that can be summed across trees."""
+    return {field: getattr(node, field) for field in STAT_FIELDS if hasattr(node, field)}
+
+
+def rave_group_stats(children):
+    """
+    Statistics of the RAVE groups of sibling nodes, each under the move of its first member.
+    Groups are shared by several siblings, so they're summed across trees once per group rather than per node.
+    Empty if the nodes have no groups.
+    """
+    group_stats = {}
+    seen = set()
+    for child in children:
+        rave_group = getattr(child, 'rave_group', None)
+        if rave_group is not None and id(rave_group) not in seen:
+            seen.add(id(rave_group))
+            group_stats[child.move] = (rave_group.N, rave_group.Q)
+    return group_stats
+
+
+def add_stats(node, stats):
+    """Add counters from another tree to a node."""
+    for field, value in stats.items():
+        setattr(node, field, getattr(node, field) + value)
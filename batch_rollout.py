@@ -0,0 +1,169 @@
+"""
+Vectorised rollouts. Plays a batch of random games at once on NumPy arrays, one ply of every game per step.
+Moves are drawn with the same weights as TreeSearch.weighted_moves, and a winning move is always taken.
+
+NumPy is imported the first time a batch is played, so the rest of the program doesn't need it.
+"""
+
+from bitboard import NEIGHBOURS
+
+COLORS = ('W', 'G')  # Color index used in the arrays, white moves on even turns
+MAX_PLIES = 200  # Safety cap, every turn builds a level so games end well before this
+
+_numpy = None
+
+
+def numpy_module():
+    """Import NumPy on first use."""
+    global _numpy
+    if _numpy is None:
+        import numpy
+        _numpy = numpy
+    return _numpy
+
+
+def simulate_games(games, seed=None):
+    """
+    Find the winners of random games played from each position.
+    The batched version of TreeSearch.simulate_random_game, the games themselves are left unchanged.
+
+    Parameters
+    ----------
+    games : list
+        Starting positions, Game objects
+    seed : int, optional
+        Seed of the NumPy generator
+
+    Returns
+    -------
+    list
+        Color that won each game
+    """
+    np = numpy_module()
+    rng = np.random.default_rng(seed)
+    adjacent = np.array([[NEIGHBOURS[square] >> other & 1 for other in range(25)] for square in range(25)],
+                        dtype=bool)
+
+    batch = len(games)
+    levels = np.array([game.levels for game in games], dtype=np.int8)  # (batch, 25)
+    workers = np.array([[[idx for idx in range(25) if game.occupants[idx] == color] for color in COLORS]
+                        for game in games], dtype=np.intp)  # (batch, color, worker) -> square
+    mover = np.array([game.turn % 2 for game in games], dtype=np.intp)
+    winner = np.array([COLORS.index(game.winner) if game.winner is not None else -1 for game in games],
+                      dtype=np.intp)
+
+    for _ in range(MAX_PLIES):
+        live = np.flatnonzero(winner < 0)
+        if len(live) == 0:
+            break
+        winner[live] = play_ply(np, rng, adjacent, levels, workers, mover, live)
+        mover[live] = 1 - mover[live]
+
+    return [COLORS[color] if color >= 0 else None for color in winner]
+
+
+def play_ply(np, rng, adjacent, levels, workers, mover, live):
+    """
+    Play one turn of every unfinished game in place.
+
+    Parameters
+    ----------
+    np : module
+        NumPy
+    rng : numpy.random.Generator
+        Source of the random move choices
+    adjacent : numpy.ndarray
+        (25, 25) adjacency matrix of the board
+    levels : numpy.ndarray
+        (batch, 25) building levels, 4 is a dome
+    workers : numpy.ndarray
+        (batch, 2, 2) squares of the workers of each color
+    mover : numpy.ndarray
+        (batch,) color index of the player to move
+    live : numpy.ndarray
+        Indices of the games still being played
+
+    Returns
+    -------
+    numpy.ndarray
+        Winner of each live game after the turn, -1 if it goes on
+    """
+    rows = np.arange(len(live))[:, None]
+    board = levels[live]  # (live, 25)
+    color = mover[live]
+    own = workers[live, color]  # (live, 2)
+    opponent = workers[live, 1 - color]
+
+    occupied = board >= 4
+    occupied[rows, own] = True
+    occupied[rows, opponent] = True
+    free = ~occupied
+
+    # Worker moves: a free neighbour at most one level up, (live, worker, square)
+    own_level = board[rows, own]
+    can_move = adjacent[own] & free[:, None, :] & (board[:, None, :] <= own_level[:, :, None] + 1)
+    result = np.full(len(live), -1, dtype=np.intp)
+
+    # A player always makes a winning move when possible
+    can_win = (can_move & (board[:, None, :] == 3)).any(axis=(1, 2))
+    result[can_win] = color[can_win]
+
+    # Square the opponent could win on next turn, only worth blocking if there's exactly one
+    opponent_level = board[rows, opponent]
+    threats = (adjacent[opponent] & free[:, None, :] & (board[:, None, :] == 3)
+               & (opponent_level == 2)[:, :, None])
+    threat_count = threats.sum(axis=(1, 2))
+    threat_square = np.where(threat_count == 1, threats.any(axis=1).argmax(axis=1), -1)
+
+    # Builds: a free neighbour of the new square, where the worker came from counts as free, (live, worker, square)
+    build_free = np.repeat(free[:, None, :], 2, axis=1)
+    build_free[rows, np.arange(2)[None, :], own] = True
+
+    # Weights of TreeSearch.weighted_moves: mover's height score after the move, 200 to block, +10 to set up a win.
+    # Sum them over the builds of each worker move first, then draw the move, then the build
+    height_score = (2 * own_level + 1).sum(axis=1)[:, None, None] + 2 * (board[:, None, :] - own_level[:, :, None])
+    adjacent_float = adjacent.astype(np.float64)
+    build_count = build_free.astype(np.float64) @ adjacent_float  # free neighbours of each square
+    build_3_count = (build_free & (board == 3)[:, None, :]).astype(np.float64) @ adjacent_float
+    move_weights = height_score * build_count + 10 * (board == 2)[:, None, :] * build_3_count
+
+    # The block replaces the usual weight of building on the threat square
+    has_threat = threat_square >= 0
+    threat = np.where(has_threat, threat_square, 0)
+    can_block = (has_threat[:, None, None] & adjacent[threat][:, None, :]
+                 & build_free[rows, np.arange(2)[None, :], threat[:, None]][:, :, None])
+    usual_weight = height_score + 10 * ((board == 2)[:, None, :] & (board[rows[:, 0], threat] == 3)[:, None, None])
+    move_weights = np.where(can_block, move_weights - usual_weight + 200, move_weights)
+    move_weights = np.where(can_move, move_weights, 0.0).reshape(len(live), -1)
+
+    # If no move can be made, player loses
+    totals = move_weights.sum(axis=1)
+    stuck = (totals == 0) & ~can_win
+    result[stuck] = 1 - color[stuck]
+
+    # Draw one worker move per game, proportional to the summed weight of its builds
+    playing = np.flatnonzero(result < 0)
+    choice = weighted_choice(np, rng, move_weights[playing], totals[playing])
+    worker, move_to = choice // 25, choice % 25
+
+    # Then the build, with the weights of that move
+    build_rows = np.arange(len(playing))
+    board = board[playing]
+    build_weights = np.where(board == 3, 10.0, 0.0) * (board[build_rows, move_to] == 2)[:, None]
+    build_weights += height_score[playing, worker, move_to][:, None]
+    build_weights[build_rows, threat[playing]] = np.where(has_threat[playing], 200.0,
+                                                          build_weights[build_rows, threat[playing]])
+    can_build = adjacent[move_to] & build_free[playing, worker]
+    build_weights = np.where(can_build, build_weights, 0.0)
+    build_at = weighted_choice(np, rng, build_weights, build_weights.sum(axis=1))
+
+    games = live[playing]
+    workers[games, color[playing], worker] = move_to
+    levels[games, build_at] += 1
+    return result
+
+
+def weighted_choice(np, rng, weights, totals):
+    """Index drawn from each row of weights, with probability proportional to its weight."""
+    draws = rng.random(len(weights)) * totals
+    return (weights.cumsum(axis=1) > draws[:, None]).argmax(axis=1)
@@ -0,0 +1,211 @@
+"""Packed integer representation of the Santorini board, used to speed up move generation."""
+
+FULL_BOARD = (1 << 25) - 1  # One bit per square, square index is i*5+j
+SQUARE_COORDS = tuple(divmod(idx, 5) for idx in range(25))  # Square index -> (i, j)
+
+# Precomputed neighbour masks for all 25 squares
+NEIGHBOURS = tuple(
+    sum(1 << ((i + di) * 5 + j + dj)
+        for di in (-1, 0, 1) for dj in (-1, 0, 1)
+        if (di != 0 or dj != 0) and 0 <= i + di <= 4 and 0 <= j + dj <= 4)
+    for i, j in SQUARE_COORDS
+)
+
+
+def squares_in_mask(mask):
+    """
+    Get square indices of the set bits, lowest index first.
+
+    Parameters
+    ----------
+    mask : int
+        Bitboard mask
+
+    Returns
+    -------
+    list
+        Square indices contained in the mask
+    """
+    square_li = []
+    while mask:
+        low_bit = mask & -mask
+        square_li.append(low_bit.bit_length() - 1)
+        mask ^= low_bit
+    return square_li
+
+
+def count_bits(mask):
+    """Number of squares in the mask."""
+    return bin(mask).count('1')
+
+
+# Every move or build target is a subset of a neighbour mask, so the coordinates of all
+# such subsets can be looked up instead of walking the bits one at a time
+SUBSET_SQUARES = {}
+SUBSET_COORDS = {}
+for _neighbour_mask in NEIGHBOURS:
+    _bits = squares_in_mask(_neighbour_mask)
+    for _subset in range(1 << len(_bits)):
+        _squares = tuple(sq for k, sq in enumerate(_bits) if _subset >> k & 1)
+        _mask = sum(1 << sq for sq in _squares)
+        SUBSET_SQUARES[_mask] = _squares
+        SUBSET_COORDS[_mask] = tuple(SQUARE_COORDS[sq] for sq in _squares)
+
+
+class BitBoard:
+    """
+    Santorini board packed into integer masks.
+
+    Attributes
+    ----------
+    level_1 : int
+        Squares built to at least level 1
+    level_2 : int
+        Squares built to at least level 2
+    level_3 : int
+        Squares built to at least level 3
+    domes : int
+        Squares capped with a dome (level 4)
+    white : int
+        Squares occupied by white workers
+    gray : int
+        Squares occupied by gray workers
+    """
+
+    def __init__(self):
+        self.level_1 = 0
+        self.level_2 = 0
+        self.level_3 = 0
+        self.domes = 0
+        self.white = 0
+        self.gray = 0
+
+    @classmethod
+    def from_lists(cls, levels, occupants):
+        """
+        Pack the flat level and occupant lists used by Game.
+
+        Parameters
+        ----------
+        levels : list
+            Flat list of 25 building levels
+        occupants : list
+            Flat list of 25 occupants ('O', 'W', 'G', 'X')
+
+        Returns
+        -------
+        BitBoard
+            Board holding the same position
+        """
+        board = cls()
+        for idx in range(25):
+            bit = 1 << idx
+            level = levels[idx]
+            if level >= 1:
+                board.level_1 |= bit
+            if level >= 2:
+                board.level_2 |= bit
+            if level >= 3:
+                board.level_3 |= bit
+            if level >= 4 or occupants[idx] == 'X':
+                board.domes |= bit
+            if occupants[idx] == 'W':
+                board.white |= bit
+            elif occupants[idx] == 'G':
+                board.gray |= bit
+        return board
+
+    def copy(self):
+        """Copy of the board, cheaper than repacking from lists."""
+        new_board = object.__new__(BitBoard)
+        new_board.level_1 = self.level_1
+        new_board.level_2 = self.level_2
+        new_board.level_3 = self.level_3
+        new_board.domes = self.domes
+        new_board.white = self.white
+        new_board.gray = self.gray
+        return new_board
+
+    @property
+    def occupied(self):
+        """Squares that cannot be moved to or built on."""
+        return self.white | self.gray | self.domes
+
+    def worker_mask(self, color):
+        """Squares occupied by workers of the given color."""
+        if color == 'W':
+            return self.white
+        return self.gray
+
+    def height(self, idx):
+        """Building level of a square."""
+        return (self.level_1 >> idx & 1) + (self.level_2 >> idx & 1) + \
+            (self.level_3 >> idx & 1) + (self.domes >> idx & 1)
+
+    def movable(self, idx):
+        """
+        Squares a worker standing on idx may move to.
+
+        Parameters
+        ----------
+        idx : int
+            Square index of the worker
+
+        Returns
+        -------
+        int
+            Mask of unoccupied neighbours at most one level higher
+        """
+        bit = 1 << idx
+        if self.level_2 & bit:
+            too_high = 0  # level 4 squares are domes, already counted as occupied
+        elif self.level_1 & bit:
+            too_high = self.level_3
+        else:
+            too_high = self.level_2
+        return NEIGHBOURS[idx] & ~(self.white | self.gray | self.domes | too_high)
+
+    def buildable(self, idx):
+        """Squares a worker standing on idx may build on."""
+        return NEIGHBOURS[idx] & ~(self.white | self.gray | self.domes)
+
+    def move_worker(self, color, from_idx, to_idx):
+        """Move a worker of the given color between squares."""
+        clear = ~(1 << from_idx)
+        self.white &= clear
+        self.gray &= clear
+        if color == 'W':
+            self.white |= 1 << to_idx
+        else:
+            self.gray |= 1 << to_idx
+
+    def build(self, idx):
+        """Add one level to a square, capping it with a dome at level 4."""
+        bit = 1 << idx
+        if self.level_3 & bit:
+            self.domes |= bit
+        elif self.level_2 & bit:
+            self.level_3 |= bit
+        elif self.level_1 & bit:
+            self.level_2 |= bit
+        else:
+            self.level_1 |= bit
+
+    def unbuild(self, idx):
+        """Remove the top level of a square, reversing build."""
+        clear = ~(1 << idx)
+        if self.domes >> idx & 1:
+            self.domes &= clear
+        elif self.level_3 >> idx & 1:
+            self.level_3 &= clear
+        elif self.level_2 >> idx & 1:
+            self.level_2 &= clear
+        else:
+            self.level_1 &= clear
+
+    def height_score(self, color):
+        """Same value as Game.get_height_score, sum of 2 * level + 1 over the color's workers."""
+        workers = self.worker_mask(color)
+        return (2 * (count_bits(workers & self.level_1) + count_bits(workers & self.level_2)
+                     + count_bits(workers & self.level_3))
+                + count_bits(workers))
@@ -2,11 +2,19 @@ import random
 import time
 import MCTS
 import MCTS_RAVE
+import MCTS_arena
+import MCTS_parallel
 import minimax_node
 from math import sqrt
+from bitboard import BitBoard, SUBSET_COORDS
+from moves import decode_move, forced_move, is_winning
+from time_manager import mcts_instability, minimax_instability
+from transposition import TranspositionTable
+from zobrist import hash_position, LEVEL_KEYS, WORKER_KEYS, TURN_KEY
 
 SYS_RANDOM = random.SystemRandom()
 SPACE_LIST = [(i, j) for i in range(5) for j in range(5)]
+USE_BITBOARD = True  # Generate moves from packed integer masks instead of scanning the flat lists
 
 # Precomputed adjacency list for all 25 squares — avoids recomputing on every call
 ADJACENT = {
@@ -28,6 +36,10 @@ class Game:
         Flat list of 25 strings representing piece occupants ('O', 'W', 'G', 'X'). Access via occupants[i*5+j]
     actives : list
         Flat list of 25 bools for GUI highlighting. Access via actives[i*5+j]
+    bits : BitBoard
+        Packed copy of levels and occupants used for move generation. None if USE_BITBOARD is off
+    zobrist : int
+        Zobrist hash of levels, workers and color to move. Usable as a dictionary key for the position
     row : int
         current row chosen by player
     col : int
@@ -42,10 +54,14 @@ class Game:
         action within a turn: place, select, move, or build
     """
 
-    def __init__(self):
+    def __init__(self, use_bitboard=None):
+        if use_bitboard is None:
+            use_bitboard = USE_BITBOARD
         self.levels = [0] * 25
         self.occupants = ['O'] * 25
         self.actives = [False] * 25
+        self.bits = BitBoard() if use_bitboard else None
+        self.zobrist = 0  # empty board, white to move
         self.row = 0
         self.col = 0
         self.winner = None
@@ -109,6 +125,7 @@ class Game:
                     self.occupants[x_1*5+y_1] == 'O'):
                 self.occupants[x_0*5+y_0] = color
                 self.occupants[x_1*5+y_1] = color
+                self.sync_board()
                 chose_spaces = True
 
     # Good opening pairs for white: spread diagonally across the inner ring
@@ -130,6 +147,7 @@ class Game:
         x1, y1 = space2
         self.occupants[x0*5+y0] = color
         self.occupants[x1*5+y1] = color
+        self.sync_board()
 
     def search_placement(self, color, max_seconds=10):
         """Pick placement for gray via short rollout search, inner squares only."""
@@ -151,6 +169,7 @@ class Game:
             x1, y1 = p2
             game_copy.occupants[x0*5+y0] = color
             game_copy.occupants[x1*5+y1] = color
+            game_copy.sync_board()
             game_copy.sub_turn = 'switch'
 
             wins = 0
@@ -172,8 +191,17 @@ class Game:
         x1, y1 = best_pair[1]
         self.occupants[x0*5+y0] = color
         self.occupants[x1*5+y1] = color
+        self.sync_board()
+
+    def sync_board(self):
+        """Repack the bitboard and rehash after levels, occupants or turn were written directly."""
+        if self.bits is not None:
+            self.bits = BitBoard.from_lists(self.levels, self.occupants)
+        self.zobrist = hash_position(self.levels, self.occupants, self.turn)
 
     def get_height_score(self, color):
+        if self.bits is not None:
+            return self.bits.height_score(color)
         score = 0
         for i, j in SPACE_LIST:
             idx = i*5+j
@@ -242,6 +270,7 @@ class Game:
             self.col = self.prev_game.col
             self.row = self.prev_game.row
             self.prev_game = None
+            self.sync_board()
             # Always return to select phase and re-highlight active workers
             self.sub_turn = 'select'
             self.make_color_active()
@@ -263,6 +292,8 @@ class Game:
         bool
             true if move is valid, false if move is invalid
         """
+        if self.bits is not None:
+            return self.bits.movable(x_val*5+y_val) != 0
         height = self.levels[x_val*5+y_val]
         for i, j in ADJACENT[(x_val, y_val)]:
             if (self.occupants[i*5+j] == 'O' and
@@ -278,6 +309,8 @@ class Game:
         bool
             true if player can build there, false otherwise
         """
+        if self.bits is not None:
+            return self.bits.buildable(x_val*5+y_val) != 0
         for i, j in ADJACENT[(x_val, y_val)]:
             if self.occupants[i*5+j] == 'O':
                 return True
@@ -342,6 +375,9 @@ class Game:
             pass
         else:
             self.occupants[idx] = color
+            if self.bits is not None:
+                self.bits.move_worker(color, idx, idx)
+            self.zobrist ^= WORKER_KEYS[color][idx]
             return True
         return False
 
@@ -371,8 +407,13 @@ class Game:
                  self.levels[prev_col*5+prev_row] > 1):
             return False
         else:
+            if self.occupants[prev_col*5+prev_row] in WORKER_KEYS:
+                self.zobrist ^= WORKER_KEYS[self.occupants[prev_col*5+prev_row]][prev_col*5+prev_row]
+            self.zobrist ^= WORKER_KEYS[self.color][x_val*5+y_val]
             self.occupants[x_val*5+y_val] = self.color
             self.occupants[prev_col*5+prev_row] = 'O'
+            if self.bits is not None:
+                self.bits.move_worker(self.color, prev_col*5+prev_row, x_val*5+y_val)
             if self.levels[x_val*5+y_val] == 3:
                 self.end_game()
             self.col = x_val
@@ -396,11 +437,84 @@ class Game:
             self.levels[idx] += 1
             if self.levels[idx] == 4:
                 self.occupants[idx] = 'X'
+            if self.bits is not None:
+                self.bits.build(idx)
+            self.zobrist ^= LEVEL_KEYS[idx][self.levels[idx] - 1] ^ LEVEL_KEYS[idx][self.levels[idx]] ^ TURN_KEY
             self.last_built_at = (x_val, y_val)
             self.sub_turn = 'switch'
             self.turn += 1
             return True
 
+    def apply_move(self, move):
+        """
+        Play a full turn (move, then build) in place, without any legality checks.
+        Used by the search engines instead of copying the game for every candidate.
+
+        Parameters
+        ----------
+        move : tuple
+            (worker, move_to, build_at) as flat square indices. build_at is None for a
+            move onto level 3, which wins the game without building
+
+        Returns
+        -------
+        tuple
+            Undo record to pass to undo_move
+        """
+        worker, move_to, build_at = move
+        color = self.occupants[worker]
+        record = (move, self.color, self.col, self.row, self.end, self.winner, self.sub_turn, self.zobrist)
+
+        self.color = color
+        self.occupants[worker] = 'O'
+        self.occupants[move_to] = color
+        if self.bits is not None:
+            self.bits.move_worker(color, worker, move_to)
+        worker_keys = WORKER_KEYS[color]
+        self.zobrist ^= worker_keys[worker] ^ worker_keys[move_to]
+        self.col, self.row = divmod(move_to, 5)
+
+        if self.levels[move_to] == 3:
+            self.end = True
+            self.winner = color
+            self.sub_turn = 'end'
+        elif build_at is not None:
+            self.levels[build_at] += 1
+            if self.levels[build_at] == 4:
+                self.occupants[build_at] = 'X'
+            if self.bits is not None:
+                self.bits.build(build_at)
+            self.zobrist ^= LEVEL_KEYS[build_at][self.levels[build_at] - 1] ^ \
+                LEVEL_KEYS[build_at][self.levels[build_at]] ^ TURN_KEY
+            self.turn += 1
+            self.sub_turn = 'switch'
+        return record
+
+    def undo_move(self, record):
+        """
+        Take back a turn played with apply_move.
+
+        Parameters
+        ----------
+        record : tuple
+            Undo record returned by apply_move
+        """
+        move, self.color, self.col, self.row, self.end, self.winner, self.sub_turn, self.zobrist = record
+        worker, move_to, build_at = move
+        if build_at is not None and self.levels[move_to] != 3:
+            if self.levels[build_at] == 4:
+                self.occupants[build_at] = 'O'
+            self.levels[build_at] -= 1
+            if self.bits is not None:
+                self.bits.unbuild(build_at)
+            self.turn -= 1
+
+        color = self.occupants[move_to]
+        self.occupants[move_to] = 'O'
+        self.occupants[worker] = color
+        if self.bits is not None:
+            self.bits.move_worker(color, move_to, worker)
+
     def play_manual_turn(self, x_val, y_val):
         """Run through a human turn."""
         if self.sub_turn == 'place':
@@ -415,25 +529,30 @@ class Game:
         elif self.sub_turn == 'build':
             self.build_level(x_val, y_val)
 
-    def play_minimax_turn(self, move_color, eval_color=None, tree_depth=4):
-        """Select turn for minimax AI player using alpha-beta pruning."""
-        if self.end:
-            return
+    def play_move_code(self, move_color, code):
+        """
+        Play an AI move and mark the squares moved to and built on.
 
+        Parameters
+        ----------
+        move_color : char
+            Color of the AI player
+        code : int
+            Move code, see moves.py
+        """
         old_occupants = self.occupants[:]
         old_levels = self.levels[:]
 
-        game_copy = self.game_deep_copy(self, self.color)
-        root_node = minimax_node.MiniMaxNode(game=game_copy, children=[])
-        best_state = root_node.alpha_beta_move_selection(root_node=root_node, depth=tree_depth,
-                                                         move_color=move_color, eval_color=eval_color)[1]
-        if best_state is None:
-            best_state = root_node.create_potential_moves(node=root_node, eval_color=eval_color, move_color=move_color)[0]
-
-        self.levels = best_state.game.levels[:]
-        self.occupants = best_state.game.occupants[:]
-        self.actives = best_state.game.actives[:]
-        self.end = best_state.game.end
+        game_copy = self.game_deep_copy(self, move_color)
+        game_copy.apply_move(decode_move(code))
+
+        self.levels = game_copy.levels[:]
+        self.occupants = game_copy.occupants[:]
+        self.make_all_spaces_inactive()
+        self.end = game_copy.end
+        self.turn = game_copy.turn
+        self.winner = game_copy.winner
+        self.sync_board()
         self.prev_game = None  # clear undo snapshot after AI move
 
         for idx in range(25):
@@ -446,21 +565,214 @@ class Game:
         if not self.end:
             self.sub_turn = 'switch'
 
-    def play_mcts_turn(self, move_color, rave=True):
-        """Select turn for MCTS AI player."""
+    def play_forced_move(self, move_color):
+        """
+        Play the move right away if there's nothing to search, ie a winning move or a single legal move.
+
+        Parameters
+        ----------
+        move_color : char
+            Color of the AI player
+
+        Returns
+        -------
+        string
+            'win' or 'single_move' if a move was played, None if the position needs a search
+        """
+        code = forced_move(self, move_color)
+        if code is None:
+            return None
+        self.play_move_code(move_color, code)
+        if is_winning(code):
+            return 'win'
+        return 'single_move'
+
+    def play_minimax_turn(self, move_color, eval_color=None, tree_depth=4, table=None, max_seconds=None,
+                          workers=1, time_manager=None):
+        """
+        Select turn for minimax AI player using alpha-beta pruning.
+
+        Parameters
+        ----------
+        tree_depth : int
+            Search depth. Ignored when max_seconds is given
+        table : TranspositionTable, optional
+            Table to search with, pass the same one every turn to keep results between turns.
+            A new table is used if not given
+        max_seconds : float, optional
+            Search with iterative deepening under this time budget instead of at a fixed depth
+        workers : int
+            Number of processes to split the root moves across. Fixed depth search only, each
+            worker uses its own transposition table
+        time_manager : TimeManager, optional
+            Clock of the player. Search with iterative deepening for the time it gives the turn,
+            takes precedence over tree_depth and max_seconds
+
+        Returns
+        -------
+        dict
+            Depth reached, score of the chosen move and nodes searched (per worker when parallel).
+            Depth 0 when a winning or single legal move was played without searching
+        """
+        if self.end:
+            return None
+
+        forced = self.play_forced_move(move_color)
+        if forced is not None:
+            score = 0
+            if forced == 'win':
+                score = 10 ** 5 if eval_color == move_color else -10 ** 5
+            return {'depth': 0, 'score': score, 'nodes': 0, 'nodes_per_worker': [0]}
+
+        if time_manager is not None:
+            max_seconds = time_manager.turn_budget(self, move_color)
+
+        game_copy = self.game_deep_copy(self, self.color)
+        root_node = minimax_node.MiniMaxNode(game=game_copy, children=[])
+        if table is None:
+            table = TranspositionTable()
+        table.new_search()
+        search_stats = {'nodes': 0, 'best_moves': []}
+        if max_seconds is not None:
+            score, best_move, depth = root_node.iterative_deepening(root_node=root_node, max_seconds=max_seconds,
+                                                                    move_color=move_color, eval_color=eval_color,
+                                                                    table=table, stats=search_stats)
+            nodes_per_worker = [search_stats['nodes']]
+        elif workers > 1:
+            score, best_move, nodes_per_worker = root_node.parallel_alpha_beta(root_node=root_node, depth=tree_depth,
+                                                                               move_color=move_color,
+                                                                               eval_color=eval_color,
+                                                                               workers=workers)
+            depth = tree_depth
+        else:
+            score, best_move = root_node.alpha_beta_move_selection(root_node=root_node, depth=tree_depth,
+                                                                   move_color=move_color, eval_color=eval_color,
+                                                                   table=table, stats=search_stats)
+            depth = tree_depth
+            nodes_per_worker = [search_stats['nodes']]
+        if best_move is None:
+            best_move = root_node.ordered_moves(game=game_copy, move_color=move_color, eval_color=eval_color)[0]
+        self.play_move_code(move_color, best_move)
+        if time_manager is not None:
+            time_manager.end_turn(minimax_instability(search_stats['best_moves']))
+
+        return {
+            'depth': depth,
+            'score': score,
+            'nodes': sum(nodes_per_worker),
+            'nodes_per_worker': nodes_per_worker,
+        }
+
+    def play_mcts_turn(self, move_color, rave=True, workers=1, parallel='root', tree=None, arena=False,
+                       batch_size=None, stop_rule=MCTS.STOP_RULE, time_manager=None, rave_mode='sibling',
+                       rollout_depth=MCTS.ROLLOUT_DEPTH, evaluator=MCTS.ROLLOUT_EVALUATOR,
+                       use_history=MCTS_RAVE.USE_HISTORY):
+        """
+        Select turn for MCTS AI player.
+
+        Parameters
+        ----------
+        move_color : char
+            Color of the AI player
+        rave : bool
+            Search with MCTS_RAVE instead of plain MCTS
+        workers : int
+            Number of processes to search with, see MCTS_parallel
+        parallel : string
+            'root' to search one tree per process, 'tree' to share one tree and only run rollouts in the processes
+        tree : TreeSearch, optional
+            Tree returned by this player's previous turn. Re-rooted at the current position if it can be found
+            in it, so its statistics carry over. Not used by root parallel search
+        arena : bool
+            Search plain MCTS with the tree stored in typed arrays, see MCTS_arena.
+            Single process only, takes precedence over rave and workers
+        batch_size : int, optional
+            Simulate leaves in batches of this size with the NumPy rollouts of batch_rollout.
+            With rollout_depth 0, score them in batches with the evaluator instead, see MCTS.TreeSearch.evaluate_batch.
+            Single process node trees only, takes precedence over arena and workers
+        stop_rule : string
+            Ends the search early once the best move is settled, see MCTS.decision_settled. None to search the
+            whole turn
+        time_manager : TimeManager, optional
+            Clock of the player. Search for the time it gives the turn instead of MCTS.TURN_TIME
+        rave_mode : string
+            How RAVE gathers its AMAF statistics: 'sibling', 'amaf' or 'grave', see MCTS_RAVE.TreeSearchRave
+        rollout_depth : int, optional
+            Cut rollouts short after this many plies and score them with the evaluator, see MCTS.TreeSearch.rollout.
+            Single process node trees only: ValueError with arena or several workers, and with batch_size
+            unless it's 0
+        evaluator : string
+            Scores truncated rollouts: 'minimax' or 'gbm', see MCTS.evaluate_position
+        use_history : bool
+            Give new RAVE nodes the win rate of their move in the search wide history table as early game score,
+            see MCTS_RAVE.TreeSearchRave.use_history. Single process or tree parallel RAVE only, ValueError otherwise
+
+        Returns
+        -------
+        dict
+            Rollouts, win rate and score of the chosen move, whether the move is a proven win or loss,
+            rollouts carried over from the previous turn, nodes in the tree and nodes pruned from it,
+            why the search stopped, and the tree to pass back in next turn (None if it can't be reused).
+            A winning or single legal move is played without searching, stop reason 'win' or 'single_move'
+        """
+        if rollout_depth is not None:
+            if arena or workers > 1:
+                raise ValueError('rollout_depth needs a single process node tree, not arena or several workers')
+            if batch_size is not None and rollout_depth != 0:
+                raise ValueError('Batches play their rollouts to the end, rollout_depth must be 0 with batch_size')
+        if use_history and (not rave or arena or (workers > 1 and parallel == 'root')):
+            raise ValueError('use_history needs a RAVE tree searched in this process, not arena or root parallel')
+
         self.check_move_available()
         if self.end:
             return
 
+        forced = self.play_forced_move(move_color)
+        if forced is not None:
+            won = forced == 'win'
+            return {'rollouts': 0, 'win_rate': 100.0 if won else 0.0, 'score': 0.0, 'reused': 0,
+                    'proven': MCTS.PROVEN_WIN if won else None, 'nodes': 0, 'freed': 0, 'stop_reason': forced,
+                    'tree': None}
+
+        max_seconds = MCTS.TURN_TIME
+        if time_manager is not None:
+            max_seconds = time_manager.turn_budget(self, move_color)
+
         old_occupants = self.occupants[:]
         old_levels = self.levels[:]
 
         game_copy = self.game_deep_copy(self, move_color)
-        if not rave:
-            mcts_game_tree = MCTS.TreeSearch(game_copy)
-        elif rave:
-            mcts_game_tree = MCTS_RAVE.TreeSearchRave(game_copy)
-        mcts_game_tree.search_tree()
+        if batch_size is not None:
+            arena = False
+            workers = 1
+        tree_class = MCTS_RAVE.RAVE_CLASSES[rave_mode] if rave else MCTS.TreeSearch
+        if arena:
+            tree_class = MCTS_arena.ArenaTreeSearch
+            workers = 1
+        if workers > 1 and parallel == 'root':
+            # The trees live in the worker processes, there's nothing to keep
+            mcts_game_tree = MCTS_parallel.RootParallelSearch(game_copy, tree_class=tree_class, workers=workers)
+            tree = None
+        else:
+            if type(tree) is not tree_class or not tree.reroot(game_copy):
+                tree = tree_class(game_copy)
+            if not arena:
+                tree.rollout_depth = rollout_depth
+                tree.evaluator = evaluator
+                if rave:
+                    tree.use_history = use_history
+            if workers > 1:
+                mcts_game_tree = MCTS_parallel.TreeParallelSearch(game_copy, tree_class=tree_class, workers=workers,
+                                                                  tree=tree)
+            else:
+                mcts_game_tree = tree
+        reused_rollouts = mcts_game_tree.root.N
+        if batch_size is not None:
+            mcts_game_tree.search_tree(max_seconds=max_seconds, batch_size=batch_size, stop_rule=stop_rule)
+        else:
+            mcts_game_tree.search_tree(max_seconds=max_seconds, stop_rule=stop_rule)
+        if time_manager is not None:
+            time_manager.end_turn(mcts_instability(mcts_game_tree.root))
         best_node = mcts_game_tree.get_best_move()
         self.levels = best_node.game.levels[:]
         self.occupants = best_node.game.occupants[:]
@@ -468,6 +780,7 @@ class Game:
         self.end = best_node.game.end
         self.turn = best_node.game.turn
         self.winner = best_node.game.winner
+        self.sync_board()
         self.prev_game = None  # clear undo snapshot after AI move
 
         for idx in range(25):
@@ -484,6 +797,12 @@ class Game:
             'rollouts': mcts_game_tree.num_rollouts,
             'win_rate': round(100 * best_node.Q / best_node.N, 1) if best_node.N > 0 else 0.0,
             'score': round(best_node.mcts_score, 3),
+            'reused': reused_rollouts,
+            'proven': best_node.proven,
+            'nodes': mcts_game_tree.node_count,
+            'freed': mcts_game_tree.freed_nodes,
+            'stop_reason': mcts_game_tree.stop_reason,
+            'tree': tree,
         }
 
     def get_distance_score(self, color, opponent_color):
@@ -510,6 +829,12 @@ class Game:
         if move_color is None:
             move_color = self.color
 
+        if self.bits is not None:
+            if self.bits.worker_mask(move_color) & self.bits.level_3:
+                self.end = True
+                return True
+            return False
+
         for i, j in SPACE_LIST:
             idx = i*5+j
             if self.levels[idx] == 3 and self.occupants[idx] == move_color:
@@ -538,6 +863,8 @@ class Game:
         new_game.levels = game.levels[:]
         new_game.occupants = game.occupants[:]
         new_game.actives = [False] * 25
+        new_game.bits = game.bits.copy() if game.bits is not None else None
+        new_game.zobrist = game.zobrist
         new_game.end = game.end
         new_game.winner = game.winner
         new_game.col = game.col
@@ -552,8 +879,13 @@ class Game:
 
     @staticmethod
     def get_movable_spaces(game, space, return_iter=True):
-        return_li = []
         x_val, y_val = space
+        if game.bits is not None:
+            return_li = SUBSET_COORDS[game.bits.movable(x_val*5+y_val)]
+            if return_iter:
+                return iter(return_li)
+            return list(return_li)
+        return_li = []
         height = game.levels[x_val*5+y_val]
         for x_adj, y_adj in ADJACENT[(x_val, y_val)]:
             idx = x_adj*5+y_adj
@@ -567,8 +899,10 @@ class Game:
 
     @staticmethod
     def get_buildable_spaces(game, space):
-        return_li = []
         x_val, y_val = space
+        if game.bits is not None:
+            return iter(SUBSET_COORDS[game.bits.buildable(x_val*5+y_val)])
+        return_li = []
         for x_adj, y_adj in ADJACENT[(x_val, y_val)]:
             if game.occupants[x_adj*5+y_adj] == 'O':
                 return_li.append((x_adj, y_adj))
@@ -0,0 +1,115 @@
+"""
+Win probability of a position from the gradient boosting model trained in tree_model_files.
+
+joblib and scikit-learn are imported the first time the model is used, so the rest of the program doesn't need them.
+"""
+
+import os
+from math import sqrt
+
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gbm_classifier.joblib')
+OFF_BOARD = 4  # Bucket of get_adjacent that counts squares off the board, along with domes
+
+# Neighbour offsets in the order of SantoriniData.get_adjacent, the feature sums depend on it
+ADJACENT_OFFSETS = ((-1, 1), (0, 1), (1, 1), (-1, 0), (1, 0), (-1, -1), (0, -1), (1, -1))
+
+_model = None
+
+
+def load_model():
+    """Load the classifier on first use."""
+    global _model
+    if _model is None:
+        import joblib
+        _model = joblib.load(MODEL_FILE)
+    return _model
+
+
+def feature_row(game):
+    """
+    Features of a position as built by tree_model_files/data_creation.SantoriniData, without the win column.
+    Read from the flat levels and occupants instead of the 2D board.
+
+    Parameters
+    ----------
+    game : Game
+        Position to describe, from the point of view of game.color
+
+    Returns
+    -------
+    list
+        Turn, for each worker (ours then the opponent's, in square order) its level and the levels around it,
+        sorted distances to the opponent's workers, and the distance between our workers
+    """
+    color = game.color
+    opponent_color = game.opponent_color
+    levels = game.levels
+    occupants = game.occupants
+
+    worker_features = {color: [], opponent_color: []}
+    spaces = {color: [], opponent_color: []}
+    for idx in range(25):
+        occupant = occupants[idx]
+        if occupant == color or occupant == opponent_color:
+            col, row = divmod(idx, 5)
+            spaces[occupant].append((col, row))
+            own_level = [0, 0, 0]
+            own_level[levels[idx]] += 1
+            worker_features[occupant].extend(own_level)
+            worker_features[occupant].extend(adjacent_levels(levels, col, row))
+
+    (player_col_0, player_row_0), (player_col_1, player_row_1) = spaces[color]
+    (opponent_col_0, opponent_row_0), (opponent_col_1, opponent_row_1) = spaces[opponent_color]
+    opponent_distance = [distance_between(player_col_0, player_row_0, opponent_col_0, opponent_row_0) / sqrt(32),
+                         distance_between(player_col_0, player_row_0, opponent_col_1, opponent_row_1) / sqrt(32),
+                         distance_between(player_col_1, player_row_1, opponent_col_1, opponent_row_1) / sqrt(32),
+                         distance_between(player_col_1, player_row_1, opponent_col_0, opponent_row_0) / sqrt(32)]
+    opponent_distance.sort()
+    # Same as the training data, which measures with the first worker's row for both
+    self_distance = distance_between(player_col_0, player_row_0, player_col_1, player_row_0) / sqrt(32)
+
+    return [game.turn / 60] + worker_features[color] + worker_features[opponent_color] + opponent_distance \
+        + [self_distance]
+
+
+def adjacent_levels(levels, col, row):
+    """Share of the 8 squares around a worker at each level, domes and off board squares together in the last."""
+    height_list = [0, 0, 0, 0, 0]
+    for d_col, d_row in ADJACENT_OFFSETS:
+        i, j = col + d_col, row + d_row
+        if 0 <= i <= 4 and 0 <= j <= 4:
+            height_list[levels[i * 5 + j]] += 1 / 8
+        else:
+            height_list[OFF_BOARD] += 1 / 8
+    return height_list
+
+
+def distance_between(col_0, row_0, col_1, row_1):
+    """Geometrics distance between two points"""
+    return sqrt((col_0 - col_1) ** 2 + (row_0 - row_1) ** 2)
+
+
+def win_probability(game):
+    """Probability that game.color wins the position, according to the model."""
+    return win_probabilities([game])[0]
+
+
+def win_probabilities(games):
+    """
+    Probability that game.color wins each position, with a single call to the model.
+    Each call to predict_proba has a large fixed cost, so positions are best scored in batches.
+
+    Parameters
+    ----------
+    games : list
+        Positions to score
+
+    Returns
+    -------
+    list
+        Win probability of each game, in order
+    """
+    if len(games) == 0:
+        return []
+    rows = [feature_row(game) for game in games]
+    return [probabilities[1] for probabilities in load_model().predict_proba(rows)]
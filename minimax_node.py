@@ -1,7 +1,20 @@
 """Tree for alpha beta pruning."""
 import pickle
+import time
+from multiprocessing import Pool
 from queue import Queue
 
+from MCTS import TURN_TIME  # Both AI players get the same time per move
+from moves import legal_moves, decode_move, is_winning
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+from zobrist import MOVER_KEYS
+
+MAX_DEPTH = 30  # Deepest iteration of iterative deepening, more than enough to reach the end of the game
+
+
+class SearchTimeout(Exception):
+    """Raised inside alpha-beta when the iterative deepening deadline has passed."""
+
 
 class MiniMaxNode:
     """
@@ -105,66 +118,250 @@ class MiniMaxNode:
         return_li.sort(key=lambda n: n.score, reverse=(move_color == eval_color))
         return return_li
 
+    @staticmethod
+    def ordered_moves(game, move_color, eval_color):
+        """
+        List legal moves in the order alpha-beta should search them.
+        Same moves and ordering as create_potential_moves, without copying the game for every candidate.
+
+        Parameters
+        ----------
+        game : Game
+            Position to generate moves from, left unchanged
+        move_color : char
+            Player color, G or W
+        eval_color:
+            Color used to produce the board score
+        Returns
+        -------
+        move_li : list
+            Move codes, see moves.py. Only the winning move if one exists
+        """
+        scored_li = []
+        levels = game.levels
+        # Building never changes worker heights, so a move's score only depends on where the worker goes
+        base_score = game.get_height_score(move_color) - game.get_height_score(game.get_opponent_color(move_color))
+        for code in legal_moves(game, move_color):
+            if is_winning(code):
+                return [code]
+            worker, move_to, _ = decode_move(code)
+            scored_li.append((base_score + 2 * (levels[move_to] - levels[worker]), code))
+
+        # Sort by score — best first for max player, worst first for min player
+        # Good move ordering dramatically increases alpha-beta pruning effectiveness
+        scored_li.sort(key=lambda n: n[0], reverse=(move_color == eval_color))
+        return [code for _, code in scored_li]
+
     @staticmethod
     def alpha_beta_move_selection(root_node, depth, alpha=-10 ** 5, beta=10 ** 5, move_color='G', eval_color='G',
-                                  is_max=True):
+                                  is_max=True, table=None, deadline=None, stats=None):
+        """
+        Score the position with alpha-beta pruning.
+        The node's game is searched in place with apply_move/undo_move and is restored on return.
+
+        Parameters
+        ----------
+        table : TranspositionTable, optional
+            Results of positions already searched, used for cutoffs and to try the stored best move
+            first. Scores are stored from eval_color's perspective, so don't share a table between players
+        deadline : float, optional
+            time.perf_counter() value after which SearchTimeout is raised. The game is left mid-search
+        stats : dict, optional
+            Its 'nodes' count is increased for every position searched
+
+        Returns
+        -------
+        tuple
+            Score of the position and the code of the best move
+        """
         root_game = root_node.game
+        if stats is not None:
+            stats['nodes'] += 1
+
         # End game, don't need to check child nodes
-        if root_node.game.end:
+        if root_game.end:
             if eval_color != move_color:
                 return 10 ** 5, None
             else:
                 return -10 ** 5, None
 
         if depth == 0:
-            return root_node.game.get_minimax_score(root_game.get_opponent_color(move_color)), None
-
-        potential_nodes = root_node.create_potential_moves(node=root_node, move_color=move_color,
-                                                           eval_color=eval_color)
-        best_node = None  # potential_nodes[0]
+            return root_game.get_minimax_score(root_game.get_opponent_color(move_color)), None
+
+        if deadline is not None and time.perf_counter() > deadline:
+            raise SearchTimeout
+
+        alpha_orig, beta_orig = alpha, beta
+        hint_move = None
+        if table is not None:
+            key = root_game.zobrist ^ MOVER_KEYS[move_color]
+            entry = table.probe(key)
+            if entry is not None:
+                _, entry_depth, entry_score, bound, hint_move, _ = entry
+                if entry_depth >= depth and (bound == EXACT or
+                                             bound == LOWER and entry_score >= beta or
+                                             bound == UPPER and entry_score <= alpha):
+                    return entry_score, hint_move
+
+        potential_moves = root_node.ordered_moves(game=root_game, move_color=move_color, eval_color=eval_color)
+        next_color = root_game.get_opponent_color(move_color)
+        best_move = None
+
+        # Search the stored best move first
+        if hint_move is not None and hint_move in potential_moves and hint_move != potential_moves[0]:
+            potential_moves.remove(hint_move)
+            potential_moves.insert(0, hint_move)
 
         if is_max:
             current_value = -10 ** 5
 
-            for node in potential_nodes:
-                node.game.color = root_game.get_opponent_color(move_color)
-                results = root_node.alpha_beta_move_selection(root_node=node, depth=depth - 1, alpha=alpha, beta=beta,
-                                                              move_color=root_game.get_opponent_color(move_color),
-                                                              eval_color=eval_color,
-                                                              is_max=not is_max)
+            for move in potential_moves:
+                record = root_game.apply_move(decode_move(move))
+                root_game.color = next_color
+                results = root_node.alpha_beta_move_selection(root_node=root_node, depth=depth - 1, alpha=alpha,
+                                                              beta=beta, move_color=next_color,
+                                                              eval_color=eval_color, is_max=not is_max,
+                                                              table=table, deadline=deadline, stats=stats)
+                root_game.undo_move(record)
 
                 if current_value < results[0]:
                     current_value = results[0]
                     alpha = max(alpha, current_value)
-                    best_node = node
+                    best_move = move
 
                 if beta <= alpha:
                     break
 
-            if best_node is None:
-                return current_value, None
-
         else:
             current_value = 10 ** 5
-            for node in potential_nodes:
-                node.game.color = root_game.get_opponent_color(move_color)
-                results = root_node.alpha_beta_move_selection(root_node=node, depth=depth - 1, alpha=alpha, beta=beta,
-                                                              move_color=root_game.get_opponent_color(move_color),
-                                                              eval_color=eval_color,
-                                                              is_max=not is_max)
+            for move in potential_moves:
+                record = root_game.apply_move(decode_move(move))
+                root_game.color = next_color
+                results = root_node.alpha_beta_move_selection(root_node=root_node, depth=depth - 1, alpha=alpha,
+                                                              beta=beta, move_color=next_color,
+                                                              eval_color=eval_color, is_max=not is_max,
+                                                              table=table, deadline=deadline, stats=stats)
+                root_game.undo_move(record)
 
                 if current_value > results[0]:
                     current_value = results[0]
                     beta = min(beta, current_value)
-                    best_node = node
+                    best_move = move
 
                 if beta <= alpha:
                     break
 
-            if best_node is None:
-                return current_value, None
+        if table is not None:
+            if current_value <= alpha_orig:
+                bound = UPPER
+            elif current_value >= beta_orig:
+                bound = LOWER
+            else:
+                bound = EXACT
+            table.store(key, depth, current_value, bound, best_move)
+
+        return current_value, best_move
+
+    @staticmethod
+    def parallel_alpha_beta(root_node, depth, move_color='G', eval_color='G', workers=2):
+        """
+        Split the root moves across a process pool, each worker searching its share with its own
+        transposition table. Every root move gets a full window, so the scores are exact and the best
+        move is the same one the serial search picks at equal depth.
+
+        Parameters
+        ----------
+        root_node : MiniMaxNode
+            Node holding the position to search, left unchanged
+        depth : int
+            Search depth, counting the root move
+        workers : int
+            Number of processes
 
-        return current_value, best_node
+        Returns
+        -------
+        tuple
+            Score, best move code, and number of nodes searched by each worker
+        """
+        root_game = root_node.game
+        potential_moves = root_node.ordered_moves(game=root_game, move_color=move_color, eval_color=eval_color)
+        if root_game.end or depth == 0 or len(potential_moves) == 0:
+            score, best_move = root_node.alpha_beta_move_selection(root_node=root_node, depth=depth,
+                                                                   move_color=move_color, eval_color=eval_color)
+            return score, best_move, [1]
+
+        # Deal the moves out in turn, so every worker gets some of the promising early ones
+        workers = min(workers, len(potential_moves))
+        tasks = [(root_game, potential_moves[i::workers], depth, move_color, eval_color) for i in range(workers)]
+        with Pool(processes=workers) as pool:
+            results = pool.map(search_root_moves, tasks)
+
+        move_scores = {}
+        for scores, _ in results:
+            move_scores.update(scores)
+
+        # Same tie-break as the serial search: first move in search order with the highest score
+        current_value = -10 ** 5
+        best_move = None
+        for move in potential_moves:
+            if current_value < move_scores[move]:
+                current_value = move_scores[move]
+                best_move = move
+
+        return current_value, best_move, [nodes for _, nodes in results]
+
+    @staticmethod
+    def iterative_deepening(root_node, max_seconds=TURN_TIME, move_color='G', eval_color='G', table=None,
+                            max_depth=MAX_DEPTH, stats=None):
+        """
+        Run alpha-beta at depth 1, 2, 3... until the time budget runs out.
+        Each iteration leaves its best moves in the transposition table, so the next one searches the
+        previous principal variation first.
+
+        Parameters
+        ----------
+        root_node : MiniMaxNode
+            Node holding the position to search, left unchanged
+        max_seconds : float
+            Wall clock budget. Depth 1 always completes
+        table : TranspositionTable, optional
+            Table shared by the iterations. A new table is used if not given
+        max_depth : int
+            Deepest iteration to run
+        stats : dict, optional
+            Its 'nodes' count is increased for every position searched, see alpha_beta_move_selection.
+            The best move of each completed iteration is appended to its 'best_moves' list, if it has one
+
+        Returns
+        -------
+        tuple
+            Score, best move code and depth of the deepest completed iteration
+        """
+        deadline = time.perf_counter() + max_seconds
+        if table is None:
+            table = TranspositionTable()
+
+        result = (None, None, 0)
+        for depth in range(1, max_depth + 1):
+            # A timed out iteration leaves its game mid-search, so each one gets a fresh copy
+            game = root_node.game.game_deep_copy(root_node.game, root_node.game.color)
+            node = MiniMaxNode(game=game, children=[])
+            try:
+                score, best_move = node.alpha_beta_move_selection(root_node=node, depth=depth,
+                                                                  move_color=move_color, eval_color=eval_color,
+                                                                  table=table,
+                                                                  deadline=deadline if depth > 1 else None,
+                                                                  stats=stats)
+            except SearchTimeout:
+                break
+
+            result = (score, best_move, depth)
+            if stats is not None and 'best_moves' in stats:
+                stats['best_moves'].append(best_move)
+            if abs(score) >= 10 ** 5:  # Forced win or loss, deeper search can't change it
+                break
+
+        return result
 
     @staticmethod
     def is_terminal(node):
@@ -200,6 +397,36 @@ class MiniMaxNode:
             tree.print_depth_first(tree)
 
 
+def search_root_moves(task):
+    """
+    Pool worker of MiniMaxNode.parallel_alpha_beta.
+
+    Parameters
+    ----------
+    task : tuple
+        Root game, root move codes to search, depth, move color and eval color
+
+    Returns
+    -------
+    tuple
+        Dictionary of move code to exact score, and number of nodes searched
+    """
+    game, move_li, depth, move_color, eval_color = task
+    next_color = game.get_opponent_color(move_color)
+    node = MiniMaxNode(game=game, children=[])
+    table = TranspositionTable()
+    stats = {'nodes': 0}
+    scores = {}
+    for move in move_li:
+        record = game.apply_move(decode_move(move))
+        game.color = next_color
+        scores[move] = node.alpha_beta_move_selection(root_node=node, depth=depth - 1, move_color=next_color,
+                                                      eval_color=eval_color, is_max=False, table=table,
+                                                      stats=stats)[0]
+        game.undo_move(record)
+    return scores, stats['nodes']
+
+
 def store_breadth_first(root, print_nodes=False):
     """
     Print values breadth first (level by level).
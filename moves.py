@@ -0,0 +1,179 @@
+"""
+Compact integer encoding of Santorini moves and a flat legal move generator.
+
+A move is packed as worker * 625 + move_to * 25 + build_at, using flat square indices (i*5+j),
+which fits in 14 bits. The two bits above hold flags, so every move fits in an unsigned short.
+A winning move (onto level 3) doesn't build, and stores build_at = move_to instead.
+"""
+
+from array import array
+
+from bitboard import BitBoard, NEIGHBOURS, SUBSET_SQUARES, squares_in_mask
+
+BLOCK_FLAG = 1 << 14  # Build lands on the only square the opponent could win on next turn
+WIN_FLAG = 1 << 15  # Move onto level 3, wins the game
+MOVE_MASK = BLOCK_FLAG - 1  # Strips flags from a move code
+
+# Move code (without flags) -> (worker, move_to, build_at)
+DECODE = tuple((code // 625, code // 25 % 25, None if code % 25 == code // 25 % 25 else code % 25)
+               for code in range(25 ** 3))
+
+
+def encode_move(worker, move_to, build_at=None, flags=0):
+    """
+    Pack a move into an integer code.
+
+    Parameters
+    ----------
+    worker : int
+        Square index of the worker that moves
+    move_to : int
+        Square index the worker moves to
+    build_at : int
+        Square index built on. None for a winning move
+    flags : int
+        WIN_FLAG and/or BLOCK_FLAG
+
+    Returns
+    -------
+    int
+        Move code
+    """
+    if build_at is None:
+        build_at = move_to
+    return worker * 625 + move_to * 25 + build_at | flags
+
+
+def decode_move(code):
+    """Unpack a move code into the (worker, move_to, build_at) tuple taken by Game.apply_move."""
+    return DECODE[code & MOVE_MASK]
+
+
+def is_winning(code):
+    """Check if the move code was flagged as a win."""
+    return code & WIN_FLAG != 0
+
+
+def to_move(game):
+    """Color to move, by turn parity. White moves on even turns."""
+    if game.turn % 2 == 0:
+        return 'W'
+    return 'G'
+
+
+def threat_square(board, color):
+    """
+    Square the given color can win on next turn.
+
+    Parameters
+    ----------
+    board : BitBoard
+        Position to check
+    color : char
+        Color of the threatening player
+
+    Returns
+    -------
+    int
+        Square index that must be blocked. -1 if there is no threat, or more than one
+        (they can't all be blocked anyway)
+    """
+    win_square = -1
+    threat_count = 0
+    for worker in squares_in_mask(board.worker_mask(color) & board.level_2 & ~board.level_3):
+        for square in SUBSET_SQUARES[board.movable(worker) & board.level_3]:
+            threat_count += 1
+            win_square = square
+            if threat_count > 1:
+                return -1
+    return win_square
+
+
+def legal_moves(game, move_color=None):
+    """
+    Generate every legal move of a position.
+    Moves come out in the same order as the nested worker/move/build loops of the search nodes.
+
+    Parameters
+    ----------
+    game : Game
+        Position to generate moves from
+    move_color : char, optional
+        Player to move. Taken from turn parity if not given
+
+    Returns
+    -------
+    array
+        Move codes, as an array('H'). Winning moves carry WIN_FLAG and builds that block the
+        opponent's only winning square carry BLOCK_FLAG
+    """
+    if move_color is None:
+        move_color = to_move(game)
+    board = game.bits if game.bits is not None else BitBoard.from_lists(game.levels, game.occupants)
+    block_square = threat_square(board, 'G' if move_color == 'W' else 'W')
+    occupied = board.white | board.gray | board.domes
+    level_3 = board.level_3
+
+    move_li = array('H')
+    for worker in squares_in_mask(board.worker_mask(move_color)):
+        for move_to in SUBSET_SQUARES[board.movable(worker)]:
+            worker_code = worker * 625 + move_to * 25
+            if level_3 >> move_to & 1:
+                move_li.append(worker_code + move_to | WIN_FLAG)
+                continue
+
+            # The square the worker left is free to build on
+            free = NEIGHBOURS[move_to] & ~(occupied ^ (1 << worker))
+            for build_at in SUBSET_SQUARES[free]:
+                if build_at == block_square:
+                    move_li.append(worker_code + build_at | BLOCK_FLAG)
+                else:
+                    move_li.append(worker_code + build_at)
+    return move_li
+
+
+def forced_move(game, move_color=None):
+    """
+    Find a move that needs no search: a win, or the only legal move.
+    Stops as soon as a second move turns up, so it's much cheaper than legal_moves.
+
+    Parameters
+    ----------
+    game : Game
+        Position to check
+    move_color : char, optional
+        Player to move. Taken from turn parity if not given
+
+    Returns
+    -------
+    int
+        Move code, a win carries WIN_FLAG. The first win in legal_moves order when there are several,
+        None if the player has a choice to make, or no move at all
+    """
+    if move_color is None:
+        move_color = to_move(game)
+    board = game.bits if game.bits is not None else BitBoard.from_lists(game.levels, game.occupants)
+    workers = squares_in_mask(board.worker_mask(move_color))
+    for worker in workers:
+        wins = board.movable(worker) & board.level_3
+        if wins:
+            move_to = SUBSET_SQUARES[wins][0]
+            return worker * 625 + move_to * 25 + move_to | WIN_FLAG
+
+    occupied = board.white | board.gray | board.domes
+    only_move = None
+    for worker in workers:
+        for move_to in SUBSET_SQUARES[board.movable(worker)]:
+            builds = SUBSET_SQUARES[NEIGHBOURS[move_to] & ~(occupied ^ (1 << worker))]
+            if not builds:
+                continue
+            if only_move is not None or len(builds) > 1:
+                return None
+            only_move = worker * 625 + move_to * 25 + builds[0]
+    return only_move
+
+
+def height_score_after(game, code):
+    """Mover's Game.get_height_score after playing the move, without playing it."""
+    worker, move_to, _ = DECODE[code & MOVE_MASK]
+    return game.get_height_score(game.occupants[worker]) + 2 * (game.levels[move_to] - game.levels[worker])
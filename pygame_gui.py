@@ -121,7 +121,8 @@ def draw_ai_stats(player, center_x, start_y):
 
 def draw_player_info(white_player, gray_player):
     """Draw player type labels above the board."""
-    type_display = {'human': 'Human', 'alphabeta': 'Minimax', 'MCTS+RAVE': 'RAVE', 'MCTS': 'MCTS'}
+    type_display = {'human': 'Human', 'alphabeta': 'Minimax', 'alphabeta-id': 'Minimax ID', 'MCTS+RAVE': 'RAVE',
+                    'MCTS': 'MCTS'}
     white_label = Button((150, 50), 'WHITE: ' + type_display.get(white_player.player_type, ''), 30, BLUE, WHITE, 1)
     gray_label = Button((650, 50), 'GRAY: ' + type_display.get(gray_player.player_type, ''), 30, BLUE, GRAY, 1)
     white_label.draw()
@@ -230,37 +231,49 @@ def get_title_screen_buttons():
         text_rgb=WHITE,
         text='Human',
         multiplier=1.2), 'white minimax': Button(
-        center_position=(200, 235),
+        center_position=(200, 225),
         font_size=40,
         bg_rgb=BLACK,
         text_rgb=WHITE,
         text='Minimax',
         multiplier=1.2), 'gray minimax': Button(
-        center_position=(600, 235),
+        center_position=(600, 225),
         font_size=40,
         bg_rgb=BLACK,
         text_rgb=WHITE,
         text='Minimax',
+        multiplier=1.2), 'white minimax ID': Button(
+        center_position=(200, 290),
+        font_size=40,
+        bg_rgb=BLACK,
+        text_rgb=WHITE,
+        text='Minimax ID',
+        multiplier=1.2), 'gray minimax ID': Button(
+        center_position=(600, 290),
+        font_size=40,
+        bg_rgb=BLACK,
+        text_rgb=WHITE,
+        text='Minimax ID',
         multiplier=1.2), 'white MCTS+RAVE': Button(
-        center_position=(200, 310),
+        center_position=(200, 355),
         font_size=40,
         bg_rgb=BLACK,
         text_rgb=WHITE,
         text='RAVE',
         multiplier=1.2), 'gray MCTS+RAVE': Button(
-        center_position=(600, 310),
+        center_position=(600, 355),
         font_size=40,
         bg_rgb=BLACK,
         text_rgb=WHITE,
         text='RAVE',
         multiplier=1.2), 'white MCTS': Button(
-        center_position=(200, 385),
+        center_position=(200, 420),
         font_size=40,
         bg_rgb=BLACK,
         text_rgb=WHITE,
         text='MCTS',
         multiplier=1.2), 'gray MCTS': Button(
-        center_position=(600, 385),
+        center_position=(600, 420),
         font_size=40,
         bg_rgb=BLACK,
         text_rgb=WHITE,
@@ -273,25 +286,31 @@ def draw_title_screen_material(arrow_dict, button_dict, counter):
     if arrow_dict['white human']:
         choose_arrow_location(30, 160 - 124)
     elif arrow_dict['white minimax']:
-        choose_arrow_location(30, 235 - 124)
+        choose_arrow_location(30, 225 - 124)
+    elif arrow_dict['white minimax ID']:
+        choose_arrow_location(30, 290 - 124)
     elif arrow_dict['white MCTS+RAVE']:
-        choose_arrow_location(30, 310 - 124)
+        choose_arrow_location(30, 355 - 124)
     elif arrow_dict['white MCTS']:
-        choose_arrow_location(30, 385 - 124)
+        choose_arrow_location(30, 420 - 124)
 
     # Choose where to show red arrow for gray piece
     if arrow_dict['gray human']:
         choose_arrow_location(410, 160 - 124)
     elif arrow_dict['gray minimax']:
-        choose_arrow_location(410, 235 - 124)
+        choose_arrow_location(410, 225 - 124)
+    elif arrow_dict['gray minimax ID']:
+        choose_arrow_location(410, 290 - 124)
     elif arrow_dict['gray MCTS+RAVE']:
-        choose_arrow_location(410, 310 - 124)
+        choose_arrow_location(410, 355 - 124)
     elif arrow_dict['gray MCTS']:
-        choose_arrow_location(410, 385 - 124)
+        choose_arrow_location(410, 420 - 124)
 
     # Show start button if all choices have been made
-    white_chosen = arrow_dict['white human'] | arrow_dict['white minimax'] | arrow_dict['white MCTS+RAVE'] | arrow_dict['white MCTS']
-    gray_chosen = arrow_dict['gray human'] | arrow_dict['gray minimax'] | arrow_dict['gray MCTS+RAVE'] | arrow_dict['gray MCTS']
+    white_chosen = arrow_dict['white human'] | arrow_dict['white minimax'] | arrow_dict['white minimax ID'] \
+        | arrow_dict['white MCTS+RAVE'] | arrow_dict['white MCTS']
+    gray_chosen = arrow_dict['gray human'] | arrow_dict['gray minimax'] | arrow_dict['gray minimax ID'] \
+        | arrow_dict['gray MCTS+RAVE'] | arrow_dict['gray MCTS']
     if white_chosen and gray_chosen and counter % 2500 < 1500:
         button_dict['start'].draw()
 
@@ -306,8 +325,10 @@ def title_screen():
     counter = 0
 
     button_dict = get_title_screen_buttons()
-    arrow_dict = {'white human': False, 'white minimax': False, 'white MCTS+RAVE': False, 'white MCTS': False,
-                  'gray human': False, 'gray minimax': False, 'gray MCTS+RAVE': False, 'gray MCTS': False}
+    arrow_dict = {'white human': False, 'white minimax': False, 'white minimax ID': False, 'white MCTS+RAVE': False,
+                  'white MCTS': False,
+                  'gray human': False, 'gray minimax': False, 'gray minimax ID': False, 'gray MCTS+RAVE': False,
+                  'gray MCTS': False}
     end_loop = False
     quit_game = False
 
@@ -328,26 +349,42 @@ def title_screen():
             # Move red arrow based on selection for white
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if button_dict['white human'].check_press(pos):
-                    arrow_dict.update({'white human': True, 'white minimax': False, 'white MCTS+RAVE': False, 'white MCTS': False})
+                    arrow_dict.update({'white human': True, 'white minimax': False, 'white minimax ID': False,
+                                       'white MCTS+RAVE': False, 'white MCTS': False})
                 elif button_dict['white minimax'].check_press(pos):
-                    arrow_dict.update({'white human': False, 'white minimax': True, 'white MCTS+RAVE': False, 'white MCTS': False})
+                    arrow_dict.update({'white human': False, 'white minimax': True, 'white minimax ID': False,
+                                       'white MCTS+RAVE': False, 'white MCTS': False})
+                elif button_dict['white minimax ID'].check_press(pos):
+                    arrow_dict.update({'white human': False, 'white minimax': False, 'white minimax ID': True,
+                                       'white MCTS+RAVE': False, 'white MCTS': False})
                 elif button_dict['white MCTS+RAVE'].check_press(pos):
-                    arrow_dict.update({'white human': False, 'white minimax': False, 'white MCTS+RAVE': True, 'white MCTS': False})
+                    arrow_dict.update({'white human': False, 'white minimax': False, 'white minimax ID': False,
+                                       'white MCTS+RAVE': True, 'white MCTS': False})
                 elif button_dict['white MCTS'].check_press(pos):
-                    arrow_dict.update({'white human': False, 'white minimax': False, 'white MCTS+RAVE': False, 'white MCTS': True})
+                    arrow_dict.update({'white human': False, 'white minimax': False, 'white minimax ID': False,
+                                       'white MCTS+RAVE': False, 'white MCTS': True})
 
                 if button_dict['gray human'].check_press(pos):
-                    arrow_dict.update({'gray human': True, 'gray minimax': False, 'gray MCTS+RAVE': False, 'gray MCTS': False})
+                    arrow_dict.update({'gray human': True, 'gray minimax': False, 'gray minimax ID': False,
+                                       'gray MCTS+RAVE': False, 'gray MCTS': False})
                 elif button_dict['gray minimax'].check_press(pos):
-                    arrow_dict.update({'gray human': False, 'gray minimax': True, 'gray MCTS+RAVE': False, 'gray MCTS': False})
+                    arrow_dict.update({'gray human': False, 'gray minimax': True, 'gray minimax ID': False,
+                                       'gray MCTS+RAVE': False, 'gray MCTS': False})
+                elif button_dict['gray minimax ID'].check_press(pos):
+                    arrow_dict.update({'gray human': False, 'gray minimax': False, 'gray minimax ID': True,
+                                       'gray MCTS+RAVE': False, 'gray MCTS': False})
                 elif button_dict['gray MCTS+RAVE'].check_press(pos):
-                    arrow_dict.update({'gray human': False, 'gray minimax': False, 'gray MCTS+RAVE': True, 'gray MCTS': False})
+                    arrow_dict.update({'gray human': False, 'gray minimax': False, 'gray minimax ID': False,
+                                       'gray MCTS+RAVE': True, 'gray MCTS': False})
                 elif button_dict['gray MCTS'].check_press(pos):
-                    arrow_dict.update({'gray human': False, 'gray minimax': False, 'gray MCTS+RAVE': False, 'gray MCTS': True})
+                    arrow_dict.update({'gray human': False, 'gray minimax': False, 'gray minimax ID': False,
+                                       'gray MCTS+RAVE': False, 'gray MCTS': True})
 
             # If both choices have been made, show the start button
-            white_chosen = arrow_dict['white human'] | arrow_dict['white minimax'] | arrow_dict['white MCTS+RAVE'] | arrow_dict['white MCTS']
-            gray_chosen = arrow_dict['gray human'] | arrow_dict['gray minimax'] | arrow_dict['gray MCTS+RAVE'] | arrow_dict['gray MCTS']
+            white_chosen = arrow_dict['white human'] | arrow_dict['white minimax'] | arrow_dict['white minimax ID'] \
+                | arrow_dict['white MCTS+RAVE'] | arrow_dict['white MCTS']
+            gray_chosen = arrow_dict['gray human'] | arrow_dict['gray minimax'] | arrow_dict['gray minimax ID'] \
+                | arrow_dict['gray MCTS+RAVE'] | arrow_dict['gray MCTS']
             if white_chosen and gray_chosen:
                 button_dict['start'].update(pos)
 
@@ -371,6 +408,8 @@ def title_screen():
         white_player = 'human'
     elif arrow_dict['white minimax']:
         white_player = 'alphabeta'
+    elif arrow_dict['white minimax ID']:
+        white_player = 'alphabeta-id'
     elif arrow_dict['white MCTS+RAVE']:
         white_player = 'MCTS+RAVE'
     elif arrow_dict['white MCTS']:
@@ -380,6 +419,8 @@ def title_screen():
         gray_player = 'human'
     elif arrow_dict['gray minimax']:
         gray_player = 'alphabeta'
+    elif arrow_dict['gray minimax ID']:
+        gray_player = 'alphabeta-id'
     elif arrow_dict['gray MCTS+RAVE']:
         gray_player = 'MCTS+RAVE'
     elif arrow_dict['gray MCTS']:
@@ -577,10 +618,14 @@ def main():
 
         this_game = Game()
 
-        white_player = SantoriniPlayer(this_game, player_dict['W'], 'W')
-        gray_player = SantoriniPlayer(this_game, player_dict['G'], 'G')
+        # Pondering shares the interpreter lock, so only ponder against a human who leaves it idle
+        ponder = 'human' in player_dict.values()
+        white_player = SantoriniPlayer(this_game, player_dict['W'], 'W', ponder=ponder)
+        gray_player = SantoriniPlayer(this_game, player_dict['G'], 'G', ponder=ponder)
 
         return_to_menu = play_game(white_player, gray_player)
+        white_player.stop_pondering()
+        gray_player.stop_pondering()
         if not return_to_menu:
             pygame.quit()
             break
@@ -0,0 +1,103 @@
+"""
+Compare truncated rollouts (MCTS.TreeSearch.rollout_depth) with full length ones.
+Measures rollouts per second from a midgame position, then plays MCTS with truncated rollouts against
+MCTS with full rollouts at the same time per move.
+
+> python rollout_benchmark.py
+"""
+
+import random
+import time
+
+import MCTS
+import MCTS_RAVE
+from game import Game
+
+BENCHMARK_GAMES = 10  # Games per truncated setting, colors alternate
+SECONDS_PER_MOVE = 1  # Search time of both players
+SPEED_SECONDS = 5  # Search time of the rollouts per second measurement
+SETTINGS = ((6, 'minimax'),)  # (rollout depth, evaluator) pairs to compare
+SEED = 0
+
+
+def midgame_position():
+    """Fixed position with a few buildings, used to measure speed."""
+    game = Game()
+    for color, idx in zip('WWGG', (6, 7, 12, 18)):
+        game.occupants[idx] = color
+    for idx, level in ((0, 2), (1, 1), (2, 2), (5, 1), (11, 2), (13, 2), (17, 2), (23, 3)):
+        game.levels[idx] = level
+    game.turn = 10
+    game.color = 'W'
+    game.sync_board()
+    return game
+
+
+def opening_position(rng):
+    """Random placement of the four workers, white to move."""
+    game = Game()
+    for color, idx in zip('WWGG', rng.sample(range(25), 4)):
+        game.occupants[idx] = color
+    game.color = 'W'
+    game.sync_board()
+    return game
+
+
+def rollouts_per_second(rollout_depth, evaluator):
+    """Rollouts per second of a RAVE search from the midgame position."""
+    tree = MCTS_RAVE.TreeSearchRave(midgame_position(), rollout_depth=rollout_depth, evaluator=evaluator)
+    tree.search_tree(SPEED_SECONDS, stop_rule=None)
+    return tree.num_rollouts / tree.run_time_seconds
+
+
+def play_game(game, truncated_color, rollout_depth, evaluator):
+    """
+    Play a game between truncated and full rollouts.
+
+    Returns
+    -------
+    char
+        Color that won, None if the game ran too long
+    """
+    while not game.end and game.turn < 100:
+        color = 'W' if game.turn % 2 == 0 else 'G'
+        game.color = color
+        if color == truncated_color:
+            game.play_mcts_turn(color, rollout_depth=rollout_depth, evaluator=evaluator, stop_rule=None)
+        else:
+            game.play_mcts_turn(color, stop_rule=None)
+    return game.winner
+
+
+def run_benchmark(settings=SETTINGS, games=BENCHMARK_GAMES, seconds_per_move=SECONDS_PER_MOVE, seed=SEED):
+    """
+    Print speed and match results of each truncated setting against full rollouts.
+
+    Returns
+    -------
+    dict
+        (rollout depth, evaluator) to (rollouts per second, games won by truncated rollouts, games played).
+        Full rollouts are under (None, None)
+    """
+    MCTS.TURN_TIME = seconds_per_move
+    results = {(None, None): (rollouts_per_second(None, MCTS.ROLLOUT_EVALUATOR), 0, 0)}
+    for rollout_depth, evaluator in settings:
+        speed = rollouts_per_second(rollout_depth, evaluator)
+        rng = random.Random(seed)
+        wins = 0
+        for game_num in range(games):
+            random.seed(rng.getrandbits(32))
+            truncated_color = 'W' if game_num % 2 == 0 else 'G'
+            wins += play_game(opening_position(rng), truncated_color, rollout_depth, evaluator) == truncated_color
+        results[(rollout_depth, evaluator)] = (speed, wins, games)
+
+    print('depth evaluator rollouts/s won')
+    for (rollout_depth, evaluator), (speed, wins, played) in results.items():
+        print(rollout_depth, evaluator, round(speed), str(wins) + '/' + str(played) if played else '-')
+    return results
+
+
+if __name__ == '__main__':
+    start_time = time.perf_counter()
+    run_benchmark()
+    print('seconds:', round(time.perf_counter() - start_time))
@@ -1,19 +1,44 @@
 """Individual playing Santorini game. Needs a refactor to replace complexity."""
 
+import threading
+
+import MCTS
+import MCTS_RAVE
+import minimax_node
+from time_manager import TimeManager
+from transposition import TranspositionTable
+
 
 class SantoriniPlayer:
     """
     Player of the Game class.
 
     Placeholder line for variables
+    ponder : bool
+        MCTS players keep searching their tree in a background thread during the opponent's turn.
+        The thread shares the interpreter lock, so this only helps while the opponent is idle, ie human
+    clock_seconds : float, optional
+        Total time of the AI for the whole game, split between its turns by a TimeManager.
+        Every turn searches for the default time if not given
+    use_history : bool
+        MCTS+RAVE players give new nodes the win rate of their move in the search wide history table,
+        see MCTS_RAVE.TreeSearchRave.use_history
     """
 
-    def __init__(self, game, player_type='human', color='W'):
+    def __init__(self, game, player_type='human', color='W', ponder=False, clock_seconds=None,
+                 use_history=MCTS_RAVE.USE_HISTORY):
         self.game = game
         self.color = color
         self.player_type = player_type
         self.placements = 0
         self.ai_stats = None
+        self.search_table = None  # transposition table kept between turns by iterative deepening players
+        self.mcts_tree = None  # search tree kept between turns by MCTS players
+        self.ponder = ponder
+        self.ponder_thread = None
+        self.ponder_stop = None
+        self.time_manager = TimeManager(clock_seconds) if clock_seconds is not None else None
+        self.use_history = use_history
 
     def __str__(self):
         """Show string representation of player."""
@@ -52,14 +77,55 @@ class SantoriniPlayer:
         if self.player_type == 'human':
             self.game.play_manual_turn(x_val, y_val)
         elif self.player_type == 'alphabeta':
-            self.game.play_minimax_turn(move_color=self.color, eval_color=self.color)
+            self.game.play_minimax_turn(move_color=self.color, eval_color=self.color,
+                                        time_manager=self.time_manager)
+            self.game.sub_turn = 'switch'
+        elif self.player_type == 'alphabeta-id':
+            if self.search_table is None:
+                self.search_table = TranspositionTable()
+            self.game.play_minimax_turn(move_color=self.color, eval_color=self.color,
+                                        table=self.search_table, max_seconds=minimax_node.TURN_TIME,
+                                        time_manager=self.time_manager)
             self.game.sub_turn = 'switch'
         elif self.player_type == 'MCTS+RAVE':
-            self.ai_stats = self.game.play_mcts_turn(self.color, rave=True)
+            self.stop_pondering()
+            self.ai_stats = self.game.play_mcts_turn(self.color, rave=True, tree=self.mcts_tree,
+                                                     time_manager=self.time_manager, use_history=self.use_history)
+            self.mcts_tree = self.ai_stats['tree'] if self.ai_stats is not None else None
             self.game.sub_turn = 'switch'
+            self.start_pondering()
         elif self.player_type == 'MCTS':
-            self.ai_stats = self.game.play_mcts_turn(self.color, rave=False)
+            self.stop_pondering()
+            self.ai_stats = self.game.play_mcts_turn(self.color, rave=False, tree=self.mcts_tree,
+                                                     time_manager=self.time_manager)
+            self.mcts_tree = self.ai_stats['tree'] if self.ai_stats is not None else None
             self.game.sub_turn = 'switch'
+            self.start_pondering()
+
+    def start_pondering(self):
+        """Search the opponent's replies to the move just played, until stop_pondering is called."""
+        if not self.ponder or self.mcts_tree is None or self.game.end:
+            return
+
+        # Root the tree at the position after our move, the opponent's choices are its children
+        if not self.mcts_tree.reroot(self.game.game_deep_copy(self.game, self.color)):
+            return
+
+        self.ponder_stop = threading.Event()
+        self.ponder_thread = threading.Thread(target=self.mcts_tree.search_tree,
+                                              kwargs={'max_seconds': MCTS.PONDER_TIME,
+                                                      'stop_event': self.ponder_stop,
+                                                      'stop_rule': None},
+                                              daemon=True)
+        self.ponder_thread.start()
+
+    def stop_pondering(self):
+        """Stop the background search, the tree can be searched again once this returns."""
+        if self.ponder_thread is None:
+            return
+        self.ponder_stop.set()
+        self.ponder_thread.join()
+        self.ponder_thread = None
 
     def update_game(self):
         """Set up next player after turn switches."""
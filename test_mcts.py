@@ -0,0 +1,94 @@
+"""Tests of the MCTS search, run with pytest."""
+
+import pytest
+
+import MCTS
+from MCTS import TreeSearch, decision_settled, PROVEN_WIN, PROVEN_LOSS
+from MCTS_RAVE import TreeSearchRave, amaf_key
+from game import Game
+from moves import legal_moves, MOVE_MASK
+
+
+def midgame_game():
+    game = Game()
+    for color, idx in zip('WWGG', (6, 8, 16, 18)):
+        game.occupants[idx] = color
+    game.turn = 10
+    game.color = 'W'
+    game.sync_board()
+    return game
+
+
+def test_proven_loss_leader_does_not_settle():
+    # The leader is never played, the two moves that can be are still close
+    child_stats = [(1720, 900, PROVEN_LOSS), (504, 250, None), (304, 150, None)]
+    assert decision_settled(child_stats, 300, 'visits') is None
+    assert decision_settled(child_stats, 100, 'visits') == 'visit_gap'
+
+
+def test_proven_win_settles():
+    child_stats = [(50, 20, None), (10, 10, PROVEN_WIN)]
+    assert decision_settled(child_stats, 10 ** 6, 'visits') == 'proven'
+
+
+def test_all_proven_losses_are_compared():
+    child_stats = [(1720, 900, PROVEN_LOSS), (20, 5, PROVEN_LOSS)]
+    assert decision_settled(child_stats, 300, 'visits') == 'visit_gap'
+
+
+def test_search_stop_reason_skips_proven_loss_leader():
+    tree = TreeSearch(midgame_game())
+    tree.add_children_to_game_tree(tree.root)
+    leader, best, runner_up = tree.root.children[:3]
+    leader.N, leader.Q, leader.proven = 1720, 900, PROVEN_LOSS
+    best.N, best.Q = 504, 250
+    runner_up.N, runner_up.Q = 304, 150
+    tree.root.N = 1720 + 504 + 304
+
+    assert tree.search_stop_reason(MCTS.MAX_ROLLOUT - 300, 1, 100, stop_rule='visits') is None
+    leader.proven = None
+    assert tree.search_stop_reason(MCTS.MAX_ROLLOUT - 300, 1, 100, stop_rule='visits') == 'visit_gap'
+
+
+def test_nested_prune_keeps_node_count():
+    tree = TreeSearch(midgame_game(), max_nodes=100)
+    # Expand a line of moves, visits falling with depth so the deepest nodes are pruned before their ancestors
+    node = tree.root
+    for depth in range(6):
+        tree.add_children_to_game_tree(node)
+        tree.node_count += len(node.children)
+        for rank, child in enumerate(node.children):
+            child.N = 1000 - 100 * depth - rank
+        node = node.children[0]
+    total_nodes = tree.count_nodes(tree.root)
+    assert tree.node_count == total_nodes
+
+    tree.prune_tree()
+    assert tree.node_count == tree.count_nodes(tree.root)
+    assert tree.node_count + tree.freed_nodes == total_nodes
+
+
+def test_history_prior_of_new_nodes():
+    tree = TreeSearchRave(midgame_game())
+    tree.use_history = True
+    history_moves = {}
+    for code in legal_moves(tree.root_game)[:3]:
+        key = amaf_key('W', code)
+        tree.history_visits[key] = 30
+        tree.history_wins[key] = 21
+        history_moves[code & MOVE_MASK] = 22 / 32
+
+    tree.add_children_to_game_tree(tree.root)
+    for child in tree.root.children:
+        assert child.early_game_score == history_moves.get(child.move & MOVE_MASK)
+
+
+def test_play_mcts_turn_use_history(monkeypatch):
+    monkeypatch.setattr(MCTS, 'TURN_TIME', 0.2)
+    game = midgame_game()
+    stats = game.play_mcts_turn('W', use_history=True, stop_rule=None)
+    assert stats['tree'].use_history
+    assert sum(stats['tree'].history_visits) > 0
+
+    with pytest.raises(ValueError):
+        midgame_game().play_mcts_turn('W', rave=False, use_history=True)
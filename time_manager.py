@@ -0,0 +1,95 @@
+"""Splits a player's total clock over the turns of a game."""
+
+import time
+from math import sqrt
+
+from moves import legal_moves
+
+GAME_TIME = 600  # Default clock of a player for the whole game, in seconds
+EXPECTED_GAME_TURNS = 40  # Turns (both players) a game usually lasts, the clock is split over our share of them
+MIN_TURNS_LEFT = 4  # Never plan for fewer of our turns than this, keeps time back for long games
+TYPICAL_BRANCHING = 60  # Legal moves of an average midgame position
+BRANCHING_RANGE = (0.5, 2.0)  # Bounds of the branching factor scaling
+INSTABILITY_WEIGHT = 1.0  # Budget is scaled by 1 + weight * instability, instability goes from 0 to 1
+INSTABILITY_DECAY = 0.5  # Weight of the newest turn in the running instability
+MAX_TURN_SHARE = 0.25  # Most of the remaining clock a single turn can use
+MIN_TURN_TIME = 0.5  # Shortest search of a turn with a choice to make, clock permitting
+OUT_OF_TIME_SEARCH = 0.05  # Search once the clock has run out, a move still has to be chosen
+
+
+class TimeManager:
+    """
+    Clock of one player. Gives each turn a share of the remaining time, more when the position has many
+    moves or recent searches kept changing their mind, and charges the time actually spent.
+
+    Attributes
+    ----------
+    remaining_seconds : float
+        Time left on the clock
+    instability : float
+        Running average of how unsettled the recent searches ended, 0 for a clear best move, 1 for a tie
+    turn_start : float
+        time.perf_counter() value when the current turn started, None between turns
+    """
+
+    def __init__(self, total_seconds=GAME_TIME):
+        self.remaining_seconds = total_seconds
+        self.instability = 0.0
+        self.turn_start = None
+
+    def turn_budget(self, game, move_color=None):
+        """
+        Start the clock of a turn and give its search time.
+
+        Parameters
+        ----------
+        game : Game
+            Position to move from
+        move_color : char, optional
+            Player to move. Taken from turn parity if not given
+
+        Returns
+        -------
+        float
+            Seconds to search for
+        """
+        self.turn_start = time.perf_counter()
+        num_moves = len(legal_moves(game, move_color))
+        turns_left = max(MIN_TURNS_LEFT, (EXPECTED_GAME_TURNS - game.turn + 1) // 2)
+        low, high = BRANCHING_RANGE
+        branching = min(high, max(low, sqrt(num_moves / TYPICAL_BRANCHING)))
+        budget = self.remaining_seconds / turns_left * branching * (1 + INSTABILITY_WEIGHT * self.instability)
+        budget = min(budget, self.remaining_seconds * MAX_TURN_SHARE)
+        return max(budget, min(MIN_TURN_TIME, self.remaining_seconds * MAX_TURN_SHARE), OUT_OF_TIME_SEARCH)
+
+    def end_turn(self, instability=None):
+        """
+        Charge the time spent since turn_budget to the clock.
+
+        Parameters
+        ----------
+        instability : float, optional
+            How unsettled the search ended, see mcts_instability and minimax_instability.
+            Keeps the previous value if not given
+        """
+        if self.turn_start is not None:
+            self.remaining_seconds = max(0.0, self.remaining_seconds - (time.perf_counter() - self.turn_start))
+            self.turn_start = None
+        if instability is not None:
+            self.instability = INSTABILITY_DECAY * instability + (1 - INSTABILITY_DECAY) * self.instability
+
+
+def mcts_instability(root):
+    """Visits of the runner up over those of the most visited root child, 1 when the two are tied."""
+    visits = sorted((child.N for child in root.children), reverse=True)
+    if len(visits) < 2 or visits[0] == 0:
+        return 0.0
+    return visits[1] / visits[0]
+
+
+def minimax_instability(best_moves):
+    """Share of iterative deepening iterations whose best move differs from the previous depth's."""
+    if len(best_moves) < 2:
+        return 0.0
+    changes = sum(move != previous for previous, move in zip(best_moves, best_moves[1:]))
+    return changes / (len(best_moves) - 1)
@@ -0,0 +1,90 @@
+"""Bounded transposition table for the alpha-beta search."""
+
+EXACT = 0  # Stored score is the exact minimax value
+LOWER = 1  # Search failed high, true value is at least the stored score
+UPPER = 2  # Search failed low, true value is at most the stored score
+
+TT_MEMORY_MB = 64  # Default memory cap of a table
+ENTRY_BYTES = 120  # Rough CPython size of one stored entry plus its slot
+
+
+class TranspositionTable:
+    """
+    Fixed number of slots indexed by position hash. Each slot holds a single entry, so memory
+    stays bounded no matter how long the search runs.
+
+    Replacement policy: an entry is kept over a shallower one from the current search, and
+    always replaced by anything from a newer search (see new_search).
+
+    Attributes
+    ----------
+    size : int
+        Number of slots
+    entries : list
+        Slots, each None or a (key, depth, score, bound, best_move, generation) tuple
+    generation : int
+        Search counter used to age out old entries
+    hits : int
+        Number of successful probes
+    """
+
+    def __init__(self, max_megabytes=TT_MEMORY_MB):
+        self.size = max(1, int(max_megabytes * 2 ** 20) // ENTRY_BYTES)
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+
+    def __len__(self):
+        """Number of filled slots."""
+        return self.size - self.entries.count(None)
+
+    def probe(self, key):
+        """
+        Look up a position.
+
+        Parameters
+        ----------
+        key : int
+            Position hash
+
+        Returns
+        -------
+        tuple
+            (key, depth, score, bound, best_move, generation), or None if the position isn't stored
+        """
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, best_move):
+        """
+        Save a search result, subject to the replacement policy.
+
+        Parameters
+        ----------
+        key : int
+            Position hash
+        depth : int
+            Remaining depth the position was searched to
+        score : float
+            Score found by the search
+        bound : int
+            EXACT, LOWER or UPPER
+        best_move : int
+            Code of the best move found, None if there was none
+        """
+        slot = key % self.size
+        entry = self.entries[slot]
+        if entry is None or entry[5] != self.generation or entry[0] == key or depth >= entry[1]:
+            self.entries[slot] = (key, depth, score, bound, best_move, self.generation)
+
+    def new_search(self):
+        """Age the stored entries so the next search can overwrite them freely."""
+        self.generation += 1
+
+    def clear(self):
+        """Drop every entry."""
+        self.entries = [None] * self.size
+        self.hits = 0
@@ -0,0 +1,38 @@
+"""Zobrist hashing of Santorini positions, used as dictionary keys by the search engines."""
+
+import random
+
+# Fixed seed so every process computes the same hash for the same position
+_KEY_RANDOM = random.Random(20210617)
+
+# LEVEL_KEYS[idx][level], level 0 hashes to 0 so an empty board hashes to 0
+LEVEL_KEYS = tuple((0,) + tuple(_KEY_RANDOM.getrandbits(64) for _ in range(4)) for _ in range(25))
+WORKER_KEYS = {color: tuple(_KEY_RANDOM.getrandbits(64) for _ in range(25)) for color in ('W', 'G')}
+TURN_KEY = _KEY_RANDOM.getrandbits(64)  # Toggled every turn, so the hash includes the color to move
+MOVER_KEYS = {'W': 0, 'G': _KEY_RANDOM.getrandbits(64)}  # Mixed in by searches that choose the mover themselves
+
+
+def hash_position(levels, occupants, turn):
+    """
+    Hash a position from scratch.
+
+    Parameters
+    ----------
+    levels : list
+        Flat list of 25 building levels
+    occupants : list
+        Flat list of 25 occupants ('O', 'W', 'G', 'X')
+    turn : int
+        Turn number, only its parity is hashed
+
+    Returns
+    -------
+    int
+        64 bit Zobrist hash
+    """
+    key = TURN_KEY if turn % 2 else 0
+    for idx in range(25):
+        key ^= LEVEL_KEYS[idx][levels[idx]]
+        if occupants[idx] in WORKER_KEYS:
+            key ^= WORKER_KEYS[occupants[idx]][idx]
+    return key